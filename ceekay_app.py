@@ -3,13 +3,33 @@ import streamlit.components.v1 as components
 import pandas as pd
 import plotly.express as px
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime, date
 import io
+import os
+import json
+import math
+import time
+import uuid
+import random
+import re
+import sqlite3
+import hashlib
+import logging
+import functools
+import threading
 import matplotlib.pyplot as plt
 import base64
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager, nullcontext
 from pathlib import Path
 
+from ceekay_storage import GspreadBackend, LocalBackend, QuotaExhausted, QuotaGovernor
+
+try:
+    import openpyxl  # optional: only the Excel downloads need it
+except ImportError:
+    openpyxl = None
+
 APP_TITLE = "CEEKAY Tours Manager"
 WORKBOOK_NAME = "CEEKAY_Driver_Reports"
 
@@ -95,45 +115,1821 @@ def render_centered_logo(width=130):
 # -------------------------------------------------------------------
 # GOOGLE SHEET CONNECTION (SAFE VERSION)
 # -------------------------------------------------------------------
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-]
+# CEEKAY_BACKEND=local runs the app against ceekay_storage.LocalBackend instead
+# of Google Sheets: worksheets are CSV files in CEEKAY_LOCAL_DATA (or held in
+# memory when that is unset), so no credentials are needed.
+STORAGE_BACKEND = os.environ.get("CEEKAY_BACKEND", "gspread").strip().lower()
+MONTHLY_CASH_FLOW_HEADER = ["month", "electricity_bill", "updated_at", "note"]
+
+# Every Sheets request goes through one QuotaGovernor sized to the API's
+# default per-user quota. Past it, requests are held back with QuotaExhausted
+# instead of failing with 429s: pages keep showing the mirror's copy, reads
+# retry on the next refresh and queued writes on their next backoff. The read
+# reserve keeps the write path's own checks going while refreshes wait.
+# Edits that find their sheet row by reading Google Sheets never fall back to
+# the mirror, whose copy may be behind: they are refused until the quota frees.
+SHEETS_READS_PER_MINUTE = 60
+SHEETS_WRITES_PER_MINUTE = 60
+SHEETS_READ_RESERVE = 10
+QUOTA_FIRST_LOAD_MESSAGE = "Google Sheets request limit reached before this data was first loaded. Please try again in a minute."
+QUOTA_EDIT_MESSAGE = "Google Sheets request limit reached, so this change was not saved. Please try again shortly."
+
+
+@st.cache_resource(show_spinner=False)
+def get_sheets_governor():
+    return QuotaGovernor(SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE, read_reserve=SHEETS_READ_RESERVE)
+
+
+# One backend per process: LocalBackend holds the worksheets themselves, so
+# every rerun and the mirror refresher must share the same instance.
+@st.cache_resource(show_spinner=False)
+def open_backend():
+    if STORAGE_BACKEND == "local":
+        return LocalBackend(os.environ.get("CEEKAY_LOCAL_DATA") or None, governor=get_sheets_governor())
+    # 🔒 Load credentials from Streamlit Secrets (not from file)
+    return GspreadBackend(st.secrets["gcp_service_account"], WORKBOOK_NAME, governor=get_sheets_governor())
+
+
+SHEET_NAMES = (
+    "drivers",
+    "daily_reports",
+    "vehicle_master",
+    "vehicle_variable_costs",
+    "monthly_cash_flow",
+)
+
+
+# Worksheet handles are opened on first use and then shared by every session,
+# so the login screen and page switches make no Sheets calls of their own.
+@st.cache_resource(show_spinner=False)
+def get_worksheet(name):
+    header = MONTHLY_CASH_FLOW_HEADER if name == "monthly_cash_flow" else None
+    return open_backend().open_worksheet(name, header=header)
+
+
+logger = logging.getLogger("ceekay")
+
+# -------------------------------------------------------------------
+# PERFORMANCE INSTRUMENTATION
+# -------------------------------------------------------------------
+# Sheet calls, mirror reads, pandas stages, figure builds and whole pages are
+# timed as spans into one PerfRecorder per process. The Diagnostics page shows
+# them with a rolling p50/p95 per page. With CEEKAY_PERF_LOG=1 each span is
+# also logged as one JSON line on the "ceekay.perf" logger.
+PERF_SPAN_HISTORY = 2000
+PERF_PAGE_HISTORY = 200
+PERF_BYTES_SAMPLE_ROWS = 200
+perf_logger = logging.getLogger("ceekay.perf")
+if os.environ.get("CEEKAY_PERF_LOG") and not perf_logger.handlers:
+    perf_logger.addHandler(logging.StreamHandler())
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+
+
+def payload_bytes(rows):
+    """Estimated JSON size of a list of rows, scaled up from the first few."""
+    if not rows:
+        return 0
+    sample = rows[:PERF_BYTES_SAMPLE_ROWS]
+    return int(len(json.dumps(sample, default=str)) * len(rows) / len(sample))
+
+
+class PerfRecorder:
+    """Recent timing spans, plus the last PERF_PAGE_HISTORY run times of each page.
+
+    A span opened while a page span is open on the same thread is tagged with
+    that page and its run number, so one page run can be broken down.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._runs = 0
+        self.spans = deque(maxlen=PERF_SPAN_HISTORY)
+        self.pages = {}
+
+    @contextmanager
+    def span(self, kind, name, **fields):
+        """Time the block; the yielded dict takes extra fields such as rows and bytes."""
+        record = {"kind": kind, "name": name, **fields}
+        outer = getattr(self._local, "page", None)
+        if kind == "page":
+            with self._lock:
+                self._runs += 1
+                self._local.page = (name, self._runs)
+        current = getattr(self._local, "page", None)
+        if current is not None:
+            record["page"], record["run"] = current
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as exc:
+            record["error"] = type(exc).__name__
+            raise
+        finally:
+            record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+            record["at"] = time.time()
+            if kind == "page":
+                self._local.page = outer
+            with self._lock:
+                self.spans.append(record)
+                if kind == "page":
+                    self.pages.setdefault(name, deque(maxlen=PERF_PAGE_HISTORY)).append(record["ms"])
+            if perf_logger.isEnabledFor(logging.INFO):
+                perf_logger.info(json.dumps(record, default=str))
+
+    def recent_spans(self):
+        with self._lock:
+            return list(self.spans)
+
+    def page_timings(self):
+        with self._lock:
+            return {page: list(times) for page, times in self.pages.items()}
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.pages.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def get_perf_recorder():
+    return PerfRecorder()
+
+
+def perf_span(kind, name, **fields):
+    return get_perf_recorder().span(kind, name, **fields)
+
+
+def timed(kind):
+    """Decorator: record each call as a span named after the function, with the result's row count."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with perf_span(kind, func.__name__) as span:
+                result = func(*args, **kwargs)
+                if isinstance(result, pd.DataFrame):
+                    span["rows"] = len(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def plotly_chart(name, fig, **kwargs):
+    """st.plotly_chart, timed as a render span (figure serialisation happens here)."""
+    with perf_span("render", name):
+        st.plotly_chart(fig, **kwargs)
+
+# -------------------------------------------------------------------
+# FIGURE CACHE
+# -------------------------------------------------------------------
+# Built plotly figures are kept per process, keyed by chart name and the
+# inputs they were drawn from (filters plus the data versions read), so a
+# rerun or another session on the same data skips the build; only builds are
+# timed as figure spans. Line charts over long ranges are summed per day, week
+# or month, the finest that stays within FIGURE_MAX_POINTS, before plotting.
+FIGURE_CACHE_SIZE = 64
+FIGURE_MAX_POINTS = 400
+DOWNSAMPLE_PERIODS = (("D", "daily"), ("W", "weekly"), ("M", "monthly"))
+
+
+@st.cache_resource(show_spinner=False)
+def _figure_cache():
+    return {"figures": OrderedDict(), "lock": threading.Lock()}
+
+
+def cached_figure(chart, inputs, build):
+    """Return the figure build() makes for ``chart`` on ``inputs``, building it once per process.
+
+    Cached figures are shared, so callers must not modify them.
+    """
+    cache = _figure_cache()
+    key = (chart, inputs)
+    with cache["lock"]:
+        fig = cache["figures"].get(key)
+        if fig is not None:
+            cache["figures"].move_to_end(key)
+            return fig
+    with perf_span("figure", chart):
+        fig = build()
+    with cache["lock"]:
+        cache["figures"][key] = fig
+        while len(cache["figures"]) > FIGURE_CACHE_SIZE:
+            cache["figures"].popitem(last=False)
+    return fig
+
+
+def downsample_dates(df, x, y, max_points=FIGURE_MAX_POINTS):
+    """Sum ``y`` per day, week or month of ``x`` once ``df`` has more than max_points rows.
+
+    Returns (frame, "daily"/"weekly"/"monthly"), or (df, None) when it already fits.
+    """
+    if len(df) <= max_points:
+        return df, None
+    for freq, label in DOWNSAMPLE_PERIODS:
+        points = df.groupby(df[x].dt.to_period(freq).dt.start_time)[y].sum().reset_index()
+        if len(points) <= max_points:
+            break
+    return points, label
+
+# -------------------------------------------------------------------
+# LOCAL SHEET MIRROR
+# -------------------------------------------------------------------
+# Pages never query Google Sheets directly. Every worksheet is copied into a
+# local SQLite file that a background thread keeps current, and all reads are
+# served from that copy. Writes still go to the sheet and are synced back.
+MIRROR_PATH = Path(os.environ.get("CEEKAY_MIRROR_PATH", ".ceekay_cache/mirror.sqlite"))
+MIRROR_REFRESH_SECONDS = 60
+
+# daily_reports only ever grows through append_row, and approvals only touch
+# the status..bank_deposit block. After one full download it is synced by
+# fetching the rows past the last synced one, plus the approval columns from
+# the oldest still-pending row onwards, in a single batch_get call.
+# vehicle_variable_costs is append-only too and has no approval columns, so
+# its delta is just the new rows.
+DELTA_SYNC_SHEETS = {"daily_reports", "vehicle_variable_costs"}
+DELTA_FULL_RESYNC_SECONDS = 1800
+APPROVAL_FIRST_COLUMN = "status"
+APPROVAL_LAST_COLUMN = "bank_deposit"
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _column_letter(col):
+    return gspread.utils.rowcol_to_a1(1, col)[:-1]
+
+
+def column_ranges(header, columns, first_row, last_row=None):
+    """Map column names to A1 ranges over rows first_row..last_row (open-ended if None).
 
-# 🔒 Load credentials from Streamlit Secrets (not from file)
-creds = ServiceAccountCredentials.from_json_keyfile_dict(
-    st.secrets["gcp_service_account"],
-    scope
+    Returns [(a1_range, [column, ...])]; adjacent columns share one range.
+    """
+    runs = []
+    for col in sorted(header.index(column) + 1 for column in columns if column in header):
+        if runs and runs[-1][1] == col - 1:
+            runs[-1][1] = col
+        else:
+            runs.append([col, col])
+    end_row = "" if last_row is None else last_row
+    return [
+        (f"{_column_letter(first)}{first_row}:{_column_letter(last)}{end_row}", header[first - 1:last])
+        for first, last in runs
+    ]
+
+
+def _pad_row(row, width):
+    row = list(row)[:width]
+    return row + [""] * (width - len(row))
+
+
+def _numericise(row, width):
+    # Same conversion get_all_records() applies, so mirrored rows keep the
+    # int/float/str values the pages were written against.
+    return gspread.utils.numericise_all(_pad_row(row, width))
+
+
+# -------------------------------------------------------------------
+# DAILY ROLLUPS
+# -------------------------------------------------------------------
+# rollup_daily keeps the money and mileage sums of daily_reports per
+# (date, vehicle, driver, status), so report pages aggregate a few hundred
+# rollup rows instead of the whole history. It lives next to the mirrored
+# rows and is adjusted in the same transaction whenever rows are appended or
+# an approval changes a row; a full sync rebuilds it from scratch.
+ROLLUP_SOURCE_SHEET = "daily_reports"
+ROLLUP_KEYS = ("date", "vehicle_no", "driver_name", "status")
+ROLLUP_MEASURES = (
+    "fare", "driver_salary", "total_driver_salary", "toll_fee", "tip", "platform_fee",
+    "amount_to_ceekay", "bank_deposit", "vehicle_running_cost", "daily_mileage",
 )
 
-client = gspread.authorize(creds)
 
+def _rollup_number(value):
+    # Same result as pd.to_numeric(errors="coerce").fillna(0) for one cell.
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
 
 
+def _create_rollup_table(con):
+    measures = "".join(f", {m} REAL NOT NULL DEFAULT 0" for m in ROLLUP_MEASURES)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS rollup_daily ("
+        "date TEXT, vehicle_no TEXT, driver_name TEXT, status TEXT, "
+        f"trips INTEGER NOT NULL DEFAULT 0{measures}, "
+        "PRIMARY KEY (date, vehicle_no, driver_name, status))"
+    )
+
+
+def _apply_rollup_rows(con, header, rows, sign):
+    """Add (sign=1) or take away (sign=-1) the contribution of daily_reports rows."""
+    if not rows:
+        return
+    positions = {c: header.index(c) for c in ROLLUP_KEYS + ROLLUP_MEASURES if c in header}
+    totals = {}
+    for row in rows:
+        key = tuple(str(row[positions[c]]) if c in positions else "" for c in ROLLUP_KEYS)
+        sums = totals.setdefault(key, [0] + [0.0] * len(ROLLUP_MEASURES))
+        sums[0] += sign
+        for i, measure in enumerate(ROLLUP_MEASURES, start=1):
+            if measure in positions:
+                sums[i] += sign * _rollup_number(row[positions[measure]])
+
+    columns = ROLLUP_KEYS + ("trips",) + ROLLUP_MEASURES
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in ("trips",) + ROLLUP_MEASURES)
+    con.executemany(
+        f"INSERT INTO rollup_daily ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT (date, vehicle_no, driver_name, status) DO UPDATE SET {updates}",
+        (key + tuple(sums) for key, sums in totals.items()),
+    )
+    con.execute("DELETE FROM rollup_daily WHERE trips <= 0")
 
-file = client.open("CEEKAY_Driver_Reports")
-drivers_sheet = file.worksheet("drivers")
-daily_sheet = file.worksheet("daily_reports")
-vehicle_master_sheet = file.worksheet("vehicle_master")
-vehicle_variable_sheet = file.worksheet("vehicle_variable_costs")
-try:
-    monthly_cash_flow_sheet = file.worksheet("monthly_cash_flow")
-except gspread.WorksheetNotFound:
-    monthly_cash_flow_sheet = file.add_worksheet(title="monthly_cash_flow", rows=200, cols=4)
-    monthly_cash_flow_sheet.append_row(["month", "electricity_bill", "updated_at", "note"])
 
-drivers_df = pd.DataFrame(drivers_sheet.get_all_records())
+def _rebuild_rollups(con, header, rows):
+    con.execute("DELETE FROM rollup_daily")
+    _apply_rollup_rows(con, header, rows, 1)
+
+# -------------------------------------------------------------------
+# DRIVER LATEST INDEX
+# -------------------------------------------------------------------
+# driver_latest holds, per driver, the most recently dated report (ties go to
+# the later sheet row) with its end_mileage and vehicle, and the status of the
+# driver's last submitted row. The Daily Entry form reads one row of it
+# instead of scanning daily_reports. Like the rollups it is refreshed in the
+# sync transaction: for the drivers touched by a delta sync, or for everyone
+# after a full sync.
+#
+# "Most recent" goes by report_dates, the date of every daily_reports row
+# normalised to YYYY-MM-DD when it is synced, since the sheet text itself
+# does not sort by date ("2024-1-5" sorts after "2024-10-01").
+DRIVER_LATEST_COLUMNS = ("driver_name", "date", "end_mileage", "vehicle_no", "status")
+_ISO_DATE_RE = re.compile(r"\s*(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T]|$)")
+
+
+def _iso_date(value):
+    """YYYY-MM-DD for a date cell, or None if it is not a date; parsed one cell at a time."""
+    text = str(value).strip()
+    match = _ISO_DATE_RE.match(text)
+    if match:
+        try:
+            return date(*map(int, match.groups())).isoformat()
+        except ValueError:
+            return None
+    parsed = pd.to_datetime(text, errors="coerce") if text else pd.NaT
+    return None if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+
+
+def _create_report_dates_table(con):
+    con.execute("CREATE TABLE IF NOT EXISTS report_dates (_row INTEGER PRIMARY KEY, date TEXT)")
+
+
+def _store_report_dates(con, header, numbered_rows):
+    """Record the normalised date of each (sheet row, daily_reports row)."""
+    if "date" not in header:
+        return
+    position = header.index("date")
+    con.executemany(
+        "INSERT OR REPLACE INTO report_dates (_row, date) VALUES (?, ?)",
+        ((sheet_row, _iso_date(row[position])) for sheet_row, row in numbered_rows),
+    )
+
+
+def _rebuild_report_dates(con, header, rows):
+    con.execute("DELETE FROM report_dates")
+    _store_report_dates(con, header, enumerate(rows, start=2))
+
+
+def _create_driver_latest_table(con):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS driver_latest ("
+        "driver_name PRIMARY KEY, date, end_mileage, vehicle_no, sheet_row INTEGER, "
+        "status, status_row INTEGER)"
+    )
+
+
+def _refresh_driver_latest(con, header, drivers=None):
+    """Recompute driver_latest for the given drivers, or for all of them."""
+    if drivers is not None:
+        drivers = list(drivers)
+        if not drivers:
+            return
+    if not set(DRIVER_LATEST_COLUMNS) <= set(header):
+        return
+    table = _quote(ROLLUP_SOURCE_SHEET)
+    where, params = "", []
+    if drivers is None:
+        con.execute("DELETE FROM driver_latest")
+    else:
+        con.executemany("DELETE FROM driver_latest WHERE driver_name = ?", [(d,) for d in drivers])
+        where, params = f"WHERE driver_name IN ({', '.join('?' * len(drivers))})", drivers
+    con.execute(
+        "INSERT INTO driver_latest "
+        "(driver_name, date, end_mileage, vehicle_no, sheet_row, status, status_row) "
+        "SELECT l.driver_name, l.date, l.end_mileage, l.vehicle_no, l._row, s.status, s._row FROM ("
+        "  SELECT r.driver_name, r.date, r.end_mileage, r.vehicle_no, r._row, ROW_NUMBER() OVER ("
+        "    PARTITION BY r.driver_name ORDER BY d.date DESC, r._row DESC) AS rn "
+        f"  FROM {table} AS r LEFT JOIN report_dates AS d ON d._row = r._row {where}"
+        ") AS l JOIN ("
+        # SQLite takes the bare status column from the row holding MAX(_row).
+        f"  SELECT driver_name, status, MAX(_row) AS _row FROM {table} {where} GROUP BY driver_name"
+        ") AS s ON s.driver_name = l.driver_name WHERE l.rn = 1",
+        params * 2,
+    )
+
+# -------------------------------------------------------------------
+# SERVICE TRACKING
+# -------------------------------------------------------------------
+# Service expenses are recorded in vehicle_variable_costs with the odometer in
+# the description ("Wheel alignment at 10500 km"). Each synced cost row is
+# parsed once into service_events (service, vehicle, odometer, date), and
+# service_latest keeps the highest serviced odometer per vehicle and service.
+# vehicle_mileage keeps each vehicle's end_mileage from its latest approved
+# report. All three are kept current in the sync transaction, so service
+# alerts read one row per vehicle instead of rescanning both sheets.
+#
+# SERVICE_TYPES: (key, label, description pattern, vehicle_master interval
+# column, default interval km, "due soon" margin km). A service is tracked for
+# a vehicle when its interval is above 0, taken from the vehicle_master column
+# when the sheet has one and from the default otherwise. Add a row here (and
+# an interval column to vehicle_master) to track another service.
+SERVICE_SOURCE_SHEET = "vehicle_variable_costs"
+SERVICE_TYPES = (
+    ("alignment", "Wheel Alignment", r"alignment", "alignment_interval_km", 0, 500),
+    ("air_filter", "Air Filter", r"air filter", "air_filter_interval_km", 0, 1000),
+    ("oil", "Oil Change", r"\boil\b", "oil_interval_km", 0, 500),
+    ("tyres", "Tyre Rotation", r"\btyres?\b", "tyre_interval_km", 0, 1000),
+    ("battery", "Battery", r"\bbattery\b", "battery_interval_km", 0, 2000),
+)
+_SERVICE_PATTERNS = [(key, re.compile(pattern, re.IGNORECASE)) for key, _, pattern, *_ in SERVICE_TYPES]
+# Same normalisation as vehicle_key(), in SQL.
+_VEHICLE_KEY_SQL = "upper(trim(replace(replace(vehicle_no, '-', ''), ' ', '')))"
+
+
+def _create_service_tables(con):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS service_events ("
+        "sheet_row INTEGER, service TEXT, vehicle TEXT, odometer REAL, date TEXT, "
+        "PRIMARY KEY (sheet_row, service))"
+    )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS service_latest ("
+        "vehicle TEXT, service TEXT, odometer REAL NOT NULL, PRIMARY KEY (vehicle, service))"
+    )
+    con.execute("CREATE TABLE IF NOT EXISTS vehicle_mileage (vehicle TEXT PRIMARY KEY, end_mileage, sheet_row INTEGER)")
+
+
+def _apply_service_rows(con, header, first_sheet_row, rows):
+    """Record the service events in vehicle_variable_costs rows starting at first_sheet_row."""
+    if not rows or not {"vehicle_no", "description"} <= set(header):
+        return
+    vehicle_at, description_at = header.index("vehicle_no"), header.index("description")
+    date_at = header.index("date") if "date" in header else None
+    events = []
+    for offset, row in enumerate(rows):
+        description = str(row[description_at])
+        matched = [key for key, pattern in _SERVICE_PATTERNS if pattern.search(description)]
+        if not matched:
+            continue
+        # The first number in the description is the odometer reading.
+        km = re.search(r"\d+", description)
+        odometer = float(km.group()) if km else None
+        day = "" if date_at is None else str(row[date_at])
+        events += [(first_sheet_row + offset, key, vehicle_key(row[vehicle_at]), odometer, day) for key in matched]
+    con.executemany("INSERT OR REPLACE INTO service_events VALUES (?, ?, ?, ?, ?)", events)
+    con.executemany(
+        "INSERT INTO service_latest (vehicle, service, odometer) VALUES (?, ?, ?) "
+        "ON CONFLICT (vehicle, service) DO UPDATE SET odometer = max(odometer, excluded.odometer)",
+        ((vehicle, key, odometer) for _, key, vehicle, odometer, _ in events if odometer is not None),
+    )
+
+
+def _rebuild_service_events(con, header, rows):
+    con.execute("DELETE FROM service_events")
+    con.execute("DELETE FROM service_latest")
+    _apply_service_rows(con, header, 2, rows)
+
+
+def _refresh_vehicle_mileage(con, header, vehicles=None):
+    """Recompute vehicle_mileage for the given vehicle keys, or for every vehicle."""
+    if vehicles is not None:
+        vehicles = list(vehicles)
+        if not vehicles:
+            return
+    if not {"vehicle_no", "date", "end_mileage", "status"} <= set(header):
+        return
+    where, params = "", []
+    if vehicles is None:
+        con.execute("DELETE FROM vehicle_mileage")
+    else:
+        con.executemany("DELETE FROM vehicle_mileage WHERE vehicle = ?", [(v,) for v in vehicles])
+        where, params = f"AND {_VEHICLE_KEY_SQL} IN ({', '.join('?' * len(vehicles))})", vehicles
+    con.execute(
+        "INSERT INTO vehicle_mileage (vehicle, end_mileage, sheet_row) "
+        "SELECT vehicle, end_mileage, _row FROM ("
+        f"  SELECT {_VEHICLE_KEY_SQL} AS vehicle, end_mileage, r._row, ROW_NUMBER() OVER ("
+        f"    PARTITION BY {_VEHICLE_KEY_SQL} ORDER BY d.date DESC, r._row DESC) AS rn "
+        f"  FROM {_quote(ROLLUP_SOURCE_SHEET)} AS r LEFT JOIN report_dates AS d ON d._row = r._row "
+        f"  WHERE status = 'Correct' {where}"
+        ") WHERE rn = 1",
+        params,
+    )
+
+
+class SheetMirror:
+    """SQLite copy of the workbook: one table per worksheet, keyed by sheet row.
+
+    fetch_values(names) -> {name: rows}, when given, downloads several
+    worksheets in one request; otherwise each one is read on its own. Sheet
+    calls and reads are timed into ``perf``, a PerfRecorder.
+    """
+
+    def __init__(self, sheet_names, open_worksheet, path, fetch_values=None, perf=None):
+        self.sheet_names = sheet_names
+        self.open_worksheet = open_worksheet
+        self.fetch_values = fetch_values
+        self.perf = perf or PerfRecorder()
+        self._path = path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._con = sqlite3.connect(str(path), check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error):
+            logger.warning("Cannot open mirror file %s, keeping the mirror in memory", path)
+            self._con = sqlite3.connect(":memory:", check_same_thread=False)
+            self._path = None
+        self._db_lock = threading.RLock()
+        self._sync_locks = {name: threading.Lock() for name in sheet_names}
+        self._last_sync = {}  # name -> (monotonic start time, was full)
+        self.throttled_since = None  # set while syncs are held back by the Sheets quota
+        with self._db_lock, self._con:
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS _mirror_meta ("
+                "sheet TEXT PRIMARY KEY, header TEXT, row_count INTEGER, version INTEGER, "
+                "digest TEXT, synced_at REAL, full_synced_at REAL)"
+            )
+            self._meta = {
+                row[0]: {
+                    "header": json.loads(row[1]),
+                    "row_count": row[2],
+                    "version": row[3],
+                    "digest": row[4],
+                    "synced_at": row[5],
+                    "full_synced_at": row[6],
+                }
+                for row in self._con.execute(
+                    "SELECT sheet, header, row_count, version, digest, synced_at, full_synced_at "
+                    "FROM _mirror_meta"
+                )
+            }
+            # Versions count from 0 again in a new mirror file (or in memory),
+            # so anything keyed on them outside the mirror adds this identity.
+            self._con.execute("CREATE TABLE IF NOT EXISTS _mirror_identity (id TEXT)")
+            row = self._con.execute("SELECT id FROM _mirror_identity").fetchone()
+            if row is None:
+                row = (uuid.uuid4().hex,)
+                self._con.execute("INSERT INTO _mirror_identity (id) VALUES (?)", row)
+            self.identity = row[0]
+            _create_rollup_table(self._con)
+            _create_driver_latest_table(self._con)
+            _create_report_dates_table(self._con)
+            # Mirror files written before rollups existed have rows but no rollups.
+            meta = self._meta.get(ROLLUP_SOURCE_SHEET)
+            empty = self._con.execute("SELECT COUNT(*) FROM rollup_daily").fetchone()[0] == 0
+            if meta and meta["row_count"] and empty:
+                _rebuild_rollups(self._con, meta["header"], self._table_rows(ROLLUP_SOURCE_SHEET))
+            # Files written before report_dates ranked reports by the raw date text.
+            stale_latest = False
+            if meta and meta["row_count"] and not self._con.execute("SELECT 1 FROM report_dates LIMIT 1").fetchone():
+                _rebuild_report_dates(self._con, meta["header"], self._table_rows(ROLLUP_SOURCE_SHEET))
+                stale_latest = True
+            if meta and meta["row_count"] and (
+                stale_latest or not self._con.execute("SELECT 1 FROM driver_latest LIMIT 1").fetchone()
+            ):
+                _refresh_driver_latest(self._con, meta["header"])
+            # Likewise for files written before service tracking.
+            _create_service_tables(self._con)
+            if meta and meta["row_count"] and (
+                stale_latest or not self._con.execute("SELECT 1 FROM vehicle_mileage LIMIT 1").fetchone()
+            ):
+                _refresh_vehicle_mileage(self._con, meta["header"])
+            costs = self._meta.get(SERVICE_SOURCE_SHEET)
+            if costs and costs["row_count"] and not self._con.execute("SELECT 1 FROM service_events LIMIT 1").fetchone():
+                _rebuild_service_events(self._con, costs["header"], self._table_rows(SERVICE_SOURCE_SHEET))
+
+    # ---------------- reads ----------------
+    def version(self, name):
+        meta = self._meta.get(name)
+        return meta["version"] if meta else 0
+
+    def synced_at(self, name):
+        meta = self._meta.get(name)
+        return meta["synced_at"] if meta else None
+
+    def _ensure_synced(self, *names):
+        missing = [name for name in names if name not in self._meta]
+        if missing:
+            self.sync_many(missing, full=True, only_missing=True)
+
+    def _table_rows(self, name):
+        return [list(row[1:]) for row in self._con.execute(f"SELECT * FROM {_quote(name)} ORDER BY _row")]
+
+    def _read_locked(self, name, columns=None):
+        meta = self._meta[name]
+        header = meta["header"]
+        if columns is not None:
+            header = [c for c in columns if c in header]
+        rows = []
+        if header:
+            columns = ", ".join(_quote(h) for h in header)
+            with self.perf.span("mirror", f"{name}.read", columns=len(header)) as span:
+                rows = self._con.execute(
+                    f"SELECT {columns} FROM {_quote(name)} ORDER BY _row"
+                ).fetchall()
+                span["rows"] = len(rows)
+        return pd.DataFrame(rows, columns=header), meta["version"]
+
+    def read(self, name, columns=None):
+        """Return (DataFrame, version) for a worksheet, syncing it first if never mirrored.
+
+        With columns, only those columns (the ones that exist) are read.
+        """
+        self._ensure_synced(name)
+        with self._db_lock:
+            return self._read_locked(name, columns)
+
+    def read_many(self, names):
+        """Return {name: (DataFrame, version)}, all read from the same mirror state."""
+        self._ensure_synced(*names)
+        with self._db_lock:
+            return {name: self._read_locked(name) for name in names}
+
+    def read_rollups(self):
+        """Return (rollup_daily DataFrame, daily_reports version)."""
+        self._ensure_synced(ROLLUP_SOURCE_SHEET)
+        with self._db_lock, self.perf.span("mirror", "rollup_daily.read") as span:
+            df = pd.read_sql_query("SELECT * FROM rollup_daily", self._con)
+            span["rows"] = len(df)
+            return df, self.version(ROLLUP_SOURCE_SHEET)
+
+    def driver_latest(self, driver_name):
+        """Return the driver_latest row for a driver as a dict, or None without reports."""
+        self._ensure_synced(ROLLUP_SOURCE_SHEET)
+        with self._db_lock:
+            cursor = self._con.execute(
+                "SELECT driver_name, date, end_mileage, vehicle_no, status FROM driver_latest "
+                "WHERE driver_name = ?", (driver_name,)
+            )
+            row = cursor.fetchone()
+        return dict(zip(DRIVER_LATEST_COLUMNS, row)) if row else None
+
+    def vehicle_mileage(self):
+        """Return ({vehicle key: end_mileage of its latest report}, daily_reports version)."""
+        self._ensure_synced(ROLLUP_SOURCE_SHEET)
+        with self._db_lock:
+            mileage = {
+                vehicle: _rollup_number(km)
+                for vehicle, km in self._con.execute("SELECT vehicle, end_mileage FROM vehicle_mileage")
+            }
+            return mileage, self.version(ROLLUP_SOURCE_SHEET)
+
+    def service_latest(self):
+        """Return ({vehicle key: {service key: last service km}}, vehicle_variable_costs version)."""
+        self._ensure_synced(SERVICE_SOURCE_SHEET)
+        with self._db_lock:
+            services = {}
+            for vehicle, service, km in self._con.execute("SELECT vehicle, service, odometer FROM service_latest"):
+                services.setdefault(vehicle, {})[service] = km
+            return services, self.version(SERVICE_SOURCE_SHEET)
+
+    def service_state(self):
+        """Return {vehicle key: {"current_mileage": km, service key: last service km}}."""
+        return _service_state(self.vehicle_mileage()[0], self.service_latest()[0])
+
+    def header(self, name):
+        self._ensure_synced(name)
+        return list(self._meta[name]["header"])
+
+    def iter_chunks(self, name, size):
+        """Return (version, iterator of DataFrames of up to ``size`` rows) over one state of a worksheet.
+
+        The rows are read in a transaction on a connection of their own, so
+        syncs carry on while a long export reads; WAL keeps its view fixed.
+        An in-memory mirror has no second connection and is read in one go.
+        """
+        self._ensure_synced(name)
+        if self._path is None:
+            df, version = self.read(name)
+            return version, (df.iloc[i:i + size] for i in range(0, len(df), size))
+        con = sqlite3.connect(str(self._path), check_same_thread=False)
+        con.execute("BEGIN")
+        header, version = con.execute(
+            "SELECT header, version FROM _mirror_meta WHERE sheet = ?", (name,)
+        ).fetchone()
+        header = json.loads(header)
+
+        def chunks():
+            try:
+                if not header:
+                    return
+                columns = ", ".join(_quote(h) for h in header)
+                cursor = con.execute(f"SELECT {columns} FROM {_quote(name)} ORDER BY _row")
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        break
+                    yield pd.DataFrame(rows, columns=header)
+            finally:
+                con.close()
+        return version, chunks()
+
+    def values(self, name):
+        """The mirrored worksheet in get_all_values() form: header row first, cells as text."""
+        self._ensure_synced(name)
+        with self._db_lock:
+            rows = self._table_rows(name)
+            header = list(self._meta[name]["header"])
+        return [header] + [["" if value is None else str(value) for value in row] for row in rows]
+
+    # ---------------- sync ----------------
+    def sync(self, name, full=False):
+        self.sync_many([name], full=full)
+
+    def sync_many(self, names, full=False, only_missing=False):
+        """Sync several worksheets. Those that need a full download share one fetch.
+
+        Requests are coalesced: a caller that had to wait for another sync of
+        the same sheet, one that started after this call was made, takes
+        that result instead of fetching again.
+        """
+        requested = time.monotonic()
+        names = [name for name in self.sheet_names if name in names]
+        with ExitStack() as stack:
+            # Locks are always taken in sheet_names order, so callers cannot deadlock.
+            for name in names:
+                stack.enter_context(self._sync_locks[name])
+            if only_missing:
+                names = [name for name in names if name not in self._meta]
+            names = [name for name in names if not self._synced_since(name, requested, full)]
+            started = time.monotonic()
+            downloads = [name for name in names if full or not self._delta_due(name)]
+            try:
+                values = self._fetch_values(downloads)
+                for name in names:
+                    if name in values:
+                        self._full_sync(name, self._meta.get(name), values[name])
+                    else:
+                        self._delta_sync(name, self._meta[name])
+                    self._last_sync[name] = (started, name in values)
+            except QuotaExhausted:
+                self.throttled_since = self.throttled_since or time.time()
+                raise
+            if names:
+                self.throttled_since = None
+
+    def _synced_since(self, name, requested, full):
+        started, was_full = self._last_sync.get(name, (None, False))
+        return started is not None and started >= requested and (was_full or not full)
+
+    def _delta_due(self, name):
+        meta = self._meta.get(name)
+        return bool(
+            name in DELTA_SYNC_SHEETS
+            and meta
+            and meta["row_count"]
+            # Rows edited or deleted by hand are only caught by a full download.
+            and time.time() - meta["full_synced_at"] < DELTA_FULL_RESYNC_SECONDS
+        )
+
+    def _fetch_values(self, names):
+        if not names:
+            return {}
+        if self.fetch_values is not None and len(names) > 1:
+            with self.perf.span("sheet", "batch_get_values", sheets=len(names)) as span:
+                values = self.fetch_values(names)
+                span["rows"] = sum(len(rows) for rows in values.values())
+                span["bytes"] = sum(payload_bytes(rows) for rows in values.values())
+            return values
+        values = {}
+        for name in names:
+            with self.perf.span("sheet", f"{name}.get_all_values") as span:
+                values[name] = self.open_worksheet(name).get_all_values()
+                span["rows"] = len(values[name])
+                span["bytes"] = payload_bytes(values[name])
+        return values
+
+    def _save_meta(self, name, **meta):
+        self._con.execute(
+            "INSERT OR REPLACE INTO _mirror_meta "
+            "(sheet, header, row_count, version, digest, synced_at, full_synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                name, json.dumps(meta["header"]), meta["row_count"], meta["version"],
+                meta["digest"], meta["synced_at"], meta["full_synced_at"],
+            ),
+        )
+        self._meta[name] = meta
+
+    def _insert_rows(self, name, first_sheet_row, rows):
+        if not rows:
+            return
+        placeholders = ", ".join("?" * (len(rows[0]) + 1))
+        self._con.executemany(
+            f"INSERT INTO {_quote(name)} VALUES ({placeholders})",
+            ([first_sheet_row + i, *row] for i, row in enumerate(rows)),
+        )
+
+    def _full_sync(self, name, meta, values):
+        digest = hashlib.sha1(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+        header = [str(h) for h in values[0]] if values else []
+        now = time.time()
+        with self._db_lock, self._con:
+            version = meta["version"] if meta else 0
+            if meta is None or meta["digest"] != digest:
+                rows = [_numericise(row, len(header)) for row in values[1:]]
+                self._con.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+                columns = "".join(f", {_quote(h)}" for h in header)
+                self._con.execute(f"CREATE TABLE {_quote(name)} (_row INTEGER PRIMARY KEY{columns})")
+                self._insert_rows(name, 2, rows)
+                if name == ROLLUP_SOURCE_SHEET:
+                    _rebuild_rollups(self._con, header, rows)
+                    _rebuild_report_dates(self._con, header, rows)
+                    _refresh_driver_latest(self._con, header)
+                    _refresh_vehicle_mileage(self._con, header)
+                elif name == SERVICE_SOURCE_SHEET:
+                    _rebuild_service_events(self._con, header, rows)
+                version += 1
+            self._save_meta(
+                name, header=header, row_count=max(len(values) - 1, 0), version=version,
+                digest=digest, synced_at=now, full_synced_at=now,
+            )
+
+    def _delta_sync(self, name, meta):
+        header = meta["header"]
+        width = len(header)
+        synced_rows = meta["row_count"]
+        table = _quote(name)
+        ranges = [f"A{synced_rows + 2}:{_column_letter(width)}"]
+
+        first_pending = None
+        approval_columns = []
+        if APPROVAL_FIRST_COLUMN in header and APPROVAL_LAST_COLUMN in header:
+            start = header.index(APPROVAL_FIRST_COLUMN)
+            end = header.index(APPROVAL_LAST_COLUMN)
+            approval_columns = header[start:end + 1]
+            with self._db_lock:
+                first_pending = self._con.execute(
+                    f"SELECT MIN(_row) FROM {table} WHERE lower({_quote(APPROVAL_FIRST_COLUMN)}) = 'pending'"
+                ).fetchone()[0]
+            if first_pending is not None and approval_columns:
+                # A contiguous block, so this is a single range.
+                ranges += [a1 for a1, _ in column_ranges(header, approval_columns, first_pending, synced_rows + 1)]
+
+        with self.perf.span("sheet", f"{name}.batch_get", ranges=len(ranges)) as span:
+            results = self.open_worksheet(name).batch_get(ranges)
+            span["rows"] = sum(len(rows) for rows in results)
+            span["bytes"] = sum(payload_bytes(rows) for rows in results)
+        new_rows = [_numericise(row, width) for row in results[0]]
+        changed = bool(new_rows)
+
+        with self._db_lock, self._con:
+            replaced, replacements, replaced_at = [], [], []
+            if len(ranges) > 1:
+                current = {
+                    row[0]: list(row[1:])
+                    for row in self._con.execute(f"SELECT * FROM {table} WHERE _row >= ?", (first_pending,))
+                }
+                assignments = ", ".join(f"{_quote(c)} = ?" for c in approval_columns)
+                fetched = list(results[1])
+                for offset, sheet_row in enumerate(range(first_pending, synced_rows + 2)):
+                    values = _numericise(fetched[offset] if offset < len(fetched) else [], len(approval_columns))
+                    old_row = current.get(sheet_row)
+                    if old_row is None or old_row[start:end + 1] == values:
+                        continue
+                    self._con.execute(f"UPDATE {table} SET {assignments} WHERE _row = ?", (*values, sheet_row))
+                    replaced.append(old_row)
+                    replacements.append(old_row[:start] + values + old_row[end + 1:])
+                    replaced_at.append(sheet_row)
+                    changed = True
+            self._insert_rows(name, synced_rows + 2, new_rows)
+            if name == ROLLUP_SOURCE_SHEET:
+                _apply_rollup_rows(self._con, header, replaced, -1)
+                _apply_rollup_rows(self._con, header, replacements + new_rows, 1)
+                _store_report_dates(self._con, header, zip(
+                    replaced_at + list(range(synced_rows + 2, synced_rows + 2 + len(new_rows))),
+                    replacements + new_rows,
+                ))
+                if "driver_name" in header:
+                    position = header.index("driver_name")
+                    _refresh_driver_latest(
+                        self._con, header, {row[position] for row in replacements + new_rows}
+                    )
+                if "vehicle_no" in header:
+                    position = header.index("vehicle_no")
+                    _refresh_vehicle_mileage(
+                        self._con, header, {vehicle_key(row[position]) for row in replacements + new_rows}
+                    )
+            elif name == SERVICE_SOURCE_SHEET:
+                _apply_service_rows(self._con, header, synced_rows + 2, new_rows)
+            self._save_meta(
+                name, header=header, row_count=synced_rows + len(new_rows),
+                version=meta["version"] + int(changed),
+                digest=None if changed else meta["digest"],
+                synced_at=time.time(), full_synced_at=meta["full_synced_at"],
+            )
+
+    # ---------------- background refresh ----------------
+    def start_refresher(self):
+        threading.Thread(target=self._refresh_loop, name="ceekay-mirror-refresh", daemon=True).start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.sync_many(self.sheet_names)
+            except QuotaExhausted:
+                logger.info("Sheets read quota used up, keeping the local copy until the next refresh")
+            except Exception:
+                # Fall back to one sheet at a time so one bad sheet does not stall the rest.
+                logger.exception("Background sync failed, retrying sheet by sheet")
+                for name in self.sheet_names:
+                    try:
+                        self.sync(name)
+                    except QuotaExhausted:
+                        break
+                    except Exception:
+                        logger.exception("Background sync of %s failed", name)
+            time.sleep(MIRROR_REFRESH_SECONDS)
+
+
+def _fetch_sheet_values(names):
+    for name in names:
+        get_worksheet(name)  # creates monthly_cash_flow on first use
+    return open_backend().batch_get_values(names)
+
+
+@st.cache_resource(show_spinner=False)
+def get_mirror():
+    mirror = SheetMirror(
+        SHEET_NAMES, get_worksheet, MIRROR_PATH, fetch_values=_fetch_sheet_values, perf=get_perf_recorder()
+    )
+    mirror.start_refresher()
+    return mirror
+
+
+def render_data_freshness():
+    mirror = get_mirror()
+    synced = [mirror.synced_at(name) for name in SHEET_NAMES]
+    synced = [ts for ts in synced if ts]
+    if not synced:
+        return
+    oldest = min(synced)
+    age = max(0, int(time.time() - oldest))
+    as_of = datetime.fromtimestamp(oldest).strftime('%Y-%m-%d %H:%M:%S')
+    if mirror.throttled_since:
+        st.warning(
+            f"Google Sheets request limit reached. Showing data as of {as_of} ({age}s ago); "
+            "it refreshes automatically once the limit resets."
+        )
+        return
+    st.caption(f"Data as of {as_of} ({age}s ago) • local copy refreshes every {MIRROR_REFRESH_SECONDS}s")
+
+# -------------------------------------------------------------------
+# WRITE QUEUE
+# -------------------------------------------------------------------
+# Sheet writes are stored in a local SQLite queue first and then sent to
+# Google Sheets, so a 429 or a dropped connection after Save does not lose
+# the entry. Writes are sent in order, consecutive writes to one sheet as
+# one request, and leave the queue only once Sheets has accepted them. A
+# failed send backs off exponentially and holds the writes behind it. A write
+# Sheets rejects outright (a 4xx other than 429, a bad range) or that fails
+# WRITE_MAX_ATTEMPTS times is parked instead, so the writes behind it go on;
+# parked writes are listed in the sidebar until retried or discarded.
+# Every write carries a key. Appends from a form use the form's submission
+# nonce (form_nonce), which stays the same across reruns until a submit
+# succeeds: an append already queued under it, or sent under it in the last
+# WRITE_DEDUP_SECONDS, is not queued again, so a double-clicked Save or a
+# rerun writes once, while two real submissions with the same figures both
+# land. Updates are keyed by their content and are safe to send again.
+WRITE_QUEUE_PATH = Path(os.environ.get("CEEKAY_WRITE_QUEUE_PATH", ".ceekay_cache/writes.sqlite"))
+WRITE_FLUSH_SECONDS = 5
+WRITE_RETRY_BASE_SECONDS = 2
+WRITE_RETRY_MAX_SECONDS = 300
+WRITE_MAX_ATTEMPTS = 20
+WRITE_DEDUP_SECONDS = 600
+WRITE_BATCH_SIZE = 50
+
+
+def _rejected(exc):
+    """True for errors retrying cannot fix: Sheets refusing the request, or a malformed write."""
+    if isinstance(exc, gspread.exceptions.APIError):
+        status = exc.code if isinstance(exc.code, int) and exc.code > 0 else exc.response.status_code
+        return 400 <= status < 500 and status != 429
+    return isinstance(exc, (ValueError, TypeError, KeyError, gspread.exceptions.WorksheetNotFound))
+
+
+def _cells_key(row):
+    # Compare a queued row with what Sheets shows for it: "2700" == 2700.0.
+    cells = gspread.utils.numericise_all(["" if v is None else str(v) for v in row])
+    while cells and cells[-1] == "":
+        cells.pop()
+    return cells
+
+
+class SheetWriteQueue:
+    """Durable, ordered queue of worksheet writes with retry and backoff.
+
+    Every write has an idempotency key: enqueueing the same key twice stores
+    it once. When a send failed without a reply from Sheets, the appended
+    rows may have landed anyway, so the retry checks the end of the sheet
+    before appending them again. Sends are timed into ``perf``, and that
+    check runs inside ``priority()`` so the quota governor puts it ahead of
+    ordinary reads.
+    """
+
+    def __init__(self, path, open_worksheet, perf=None, priority=None):
+        self.open_worksheet = open_worksheet
+        self.perf = perf or PerfRecorder()
+        self.priority = priority or nullcontext
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._con = sqlite3.connect(str(path), check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error):
+            logger.warning("Cannot open write queue file %s, keeping the queue in memory", path)
+            self._con = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db_lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        with self._db_lock, self._con:
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS write_queue ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL, "
+                "sheet TEXT NOT NULL, op TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL DEFAULT 0, "
+                "last_error TEXT, uncertain INTEGER NOT NULL DEFAULT 0, parked INTEGER NOT NULL DEFAULT 0)"
+            )
+            # Queue files written before writes could be parked.
+            columns = [row[1] for row in self._con.execute("PRAGMA table_info(write_queue)")]
+            if "parked" not in columns:
+                self._con.execute("ALTER TABLE write_queue ADD COLUMN parked INTEGER NOT NULL DEFAULT 0")
+            self._con.execute("CREATE TABLE IF NOT EXISTS sent_keys (key TEXT PRIMARY KEY, sent_at REAL NOT NULL)")
+
+    def enqueue(self, sheet, op, payload, key=None):
+        """Queue an "append" (payload: rows) or "update" (payload: data, value_input_option).
+
+        An append whose key is already queued, or was sent within
+        WRITE_DEDUP_SECONDS, is dropped. An update already queued, parked or
+        not, is replaced by one at the end, so it still lands after the
+        writes queued since.
+        """
+        key = key or uuid.uuid4().hex
+        now = time.time()
+        with self._db_lock, self._con:
+            self._con.execute("DELETE FROM sent_keys WHERE sent_at < ?", (now - WRITE_DEDUP_SECONDS,))
+            if self._con.execute("SELECT 1 FROM sent_keys WHERE key = ?", (key,)).fetchone():
+                logger.warning("Dropped a repeated write to %s: key %s was already sent", sheet, key)
+                return key
+            if op == "update":
+                self._con.execute("DELETE FROM write_queue WHERE key = ?", (key,))
+            inserted = self._con.execute(
+                "INSERT OR IGNORE INTO write_queue (key, sheet, op, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, sheet, op, json.dumps(payload, default=str), now),
+            ).rowcount
+            if not inserted:
+                logger.warning("Dropped a repeated write to %s: key %s is already queued", sheet, key)
+        self._wake.set()
+        return key
+
+    def pending(self):
+        """Return (number of queued writes, last error of the oldest failing one); parked ones not included."""
+        with self._db_lock:
+            count = self._con.execute("SELECT COUNT(*) FROM write_queue WHERE parked = 0").fetchone()[0]
+            error = self._con.execute(
+                "SELECT last_error FROM write_queue WHERE parked = 0 AND last_error IS NOT NULL ORDER BY id LIMIT 1"
+            ).fetchone()
+        return count, error[0] if error else None
+
+    def parked(self):
+        """Return the parked writes as dicts: id, sheet, op, created_at, attempts, last_error."""
+        with self._db_lock:
+            rows = self._con.execute(
+                "SELECT id, sheet, op, created_at, attempts, last_error FROM write_queue WHERE parked = 1 ORDER BY id"
+            ).fetchall()
+        return [dict(zip(("id", "sheet", "op", "created_at", "attempts", "last_error"), row)) for row in rows]
+
+    def retry_parked(self):
+        """Put every parked write back in the queue with a fresh attempt count."""
+        with self._db_lock, self._con:
+            self._con.execute("UPDATE write_queue SET parked = 0, attempts = 0, next_attempt_at = 0 WHERE parked = 1")
+        self._wake.set()
+
+    def discard_parked(self):
+        with self._db_lock, self._con:
+            self._con.execute("DELETE FROM write_queue WHERE parked = 1")
+
+    def _next_batch(self):
+        """Return (sheet, op, [(id, payload, uncertain)]) for the writes due now.
+
+        The batch is the oldest write plus the ones right behind it that go
+        to the same sheet the same way. Returns None if nothing is due.
+        """
+        with self._db_lock:
+            items = self._con.execute(
+                "SELECT id, sheet, op, payload, uncertain, next_attempt_at FROM write_queue "
+                "WHERE parked = 0 ORDER BY id LIMIT ?",
+                (WRITE_BATCH_SIZE,),
+            ).fetchall()
+        if not items or items[0][5] > time.time():
+            return None
+        sheet, op, head_payload = items[0][1], items[0][2], json.loads(items[0][3])
+        batch = []
+        for item_id, item_sheet, item_op, payload, uncertain, _ in items:
+            payload = json.loads(payload)
+            if (item_sheet, item_op) != (sheet, op):
+                break
+            if op == "update" and payload["value_input_option"] != head_payload["value_input_option"]:
+                break
+            batch.append((item_id, payload, uncertain))
+        return sheet, op, batch
+
+    def _send(self, sheet, op, batch):
+        ws = self.open_worksheet(sheet)
+        if op == "append":
+            rows = [row for _, payload, _ in batch for row in payload]
+            if any(uncertain for _, _, uncertain in batch):
+                with self.priority(), self.perf.span("sheet", f"{sheet}.get_all_values") as span:
+                    values = ws.get_all_values()
+                    span.update(rows=len(values), bytes=payload_bytes(values))
+                tail = values[-len(rows):]
+                if [_cells_key(r) for r in tail] == [_cells_key(r) for r in rows]:
+                    return  # the earlier attempt went through
+            with self.perf.span("sheet", f"{sheet}.append_rows", rows=len(rows), bytes=payload_bytes(rows)):
+                ws.append_rows(rows)
+        else:
+            data = [item for _, payload, _ in batch for item in payload["data"]]
+            cells = [row for item in data for row in item["values"]]
+            with self.perf.span("sheet", f"{sheet}.batch_update", rows=len(cells), bytes=payload_bytes(cells)):
+                ws.batch_update(data, value_input_option=batch[0][1]["value_input_option"])
+
+    def _backoff(self, ids, exc):
+        """Schedule a retry for the writes in ``ids``, or park them; return True if parked."""
+        # An APIError is a reply from Sheets and QuotaExhausted means nothing
+        # was sent, so nothing was written; anything else (timeouts, dropped
+        # connections) may have been applied.
+        uncertain = int(not isinstance(exc, (gspread.exceptions.APIError, QuotaExhausted)))
+        with self._db_lock, self._con:
+            attempts = self._con.execute("SELECT attempts FROM write_queue WHERE id = ?", (ids[0],)).fetchone()[0]
+            parked = int(_rejected(exc) or attempts + 1 >= WRITE_MAX_ATTEMPTS)
+            delay = min(WRITE_RETRY_BASE_SECONDS * 2 ** attempts, WRITE_RETRY_MAX_SECONDS)
+            self._con.executemany(
+                "UPDATE write_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?, "
+                "uncertain = MAX(uncertain, ?), parked = ? WHERE id = ?",
+                [(time.time() + delay * random.uniform(0.5, 1.0), str(exc)[:200], uncertain, parked, i) for i in ids],
+            )
+        return bool(parked)
+
+    def _sent(self, ids):
+        # Appends stay remembered by key for a while so a repeat is dropped;
+        # updates are safe to apply again.
+        with self._db_lock, self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO sent_keys (key, sent_at) "
+                "SELECT key, ? FROM write_queue WHERE id = ? AND op = 'append'",
+                [(time.time(), i) for i in ids],
+            )
+            self._con.executemany("DELETE FROM write_queue WHERE id = ?", [(i,) for i in ids])
+
+    def _send_each(self, sheet, op, batch, written):
+        # A rejected batch is sent one write at a time, so only the writes
+        # Sheets refuses are parked. Returns False if one is to be retried.
+        for item in batch:
+            try:
+                self._send(sheet, op, [item])
+            except Exception as exc:
+                logger.warning("Write to %s failed: %s", sheet, exc)
+                if not self._backoff([item[0]], exc):
+                    return False
+                continue
+            self._sent([item[0]])
+            written.add(sheet)
+        return True
+
+    def flush(self):
+        """Send due writes until none are left or a send fails; return the sheets written."""
+        written = set()
+        with self._flush_lock:
+            while True:
+                due = self._next_batch()
+                if due is None:
+                    return written
+                sheet, op, batch = due
+                ids = [item_id for item_id, _, _ in batch]
+                try:
+                    self._send(sheet, op, batch)
+                except Exception as exc:
+                    if _rejected(exc) and len(batch) > 1:
+                        if self._send_each(sheet, op, batch, written):
+                            continue
+                        return written
+                    logger.warning("Write to %s failed: %s", sheet, exc)
+                    if self._backoff(ids, exc):
+                        continue
+                    return written
+                self._sent(ids)
+                written.add(sheet)
+
+    def start_flusher(self, on_written):
+        threading.Thread(
+            target=self._flush_loop, args=(on_written,), name="ceekay-write-queue", daemon=True
+        ).start()
+
+    def _flush_loop(self, on_written):
+        while True:
+            self._wake.wait(WRITE_FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                written = self.flush()
+                if written:
+                    on_written(written)
+            except Exception:
+                logger.exception("Flushing the write queue failed")
+
+
+@st.cache_resource(show_spinner=False)
+def get_write_queue():
+    queue = SheetWriteQueue(
+        WRITE_QUEUE_PATH, get_worksheet, perf=get_perf_recorder(), priority=get_sheets_governor().priority
+    )
+    queue.start_flusher(lambda sheets: get_mirror().sync_many(sheets))
+    return queue
+
+
+def render_pending_writes():
+    queue = get_write_queue()
+    count, error = queue.pending()
+    if count:
+        st.caption(f"⏳ {count} change{'s' if count != 1 else ''} waiting to sync to Google Sheets")
+        if error:
+            st.caption(f"Last error: {error}")
+    parked = queue.parked()
+    if parked:
+        with st.expander(f"⚠ {len(parked)} change{'s' if len(parked) != 1 else ''} not saved to Google Sheets"):
+            for item in parked:
+                at = datetime.fromtimestamp(item["created_at"]).strftime("%Y-%m-%d %H:%M")
+                st.caption(f"{item['sheet']} {item['op']} from {at}, {item['attempts']} attempts: {item['last_error']}")
+            c1, c2 = st.columns(2)
+            c1.button("Retry", key="parked_writes_retry", on_click=queue.retry_parked, use_container_width=True)
+            c2.button("Discard", key="parked_writes_discard", on_click=queue.discard_parked, use_container_width=True)
+
+# -------------------------------------------------------------------
+# DAILY REPORTS SCHEMA
+# -------------------------------------------------------------------
+# Report pages read daily_reports through read_daily_reports(), which coerces
+# these columns once per snapshot instead of each page running its own
+# to_numeric / to_datetime pass. Amounts are float64 rather than float32:
+# monthly totals run into millions of rupees, past what float32 keeps exact
+# to the cent.
+DAILY_REPORTS_SCHEMA = {
+    "date": "datetime64[ns]",
+    "driver_name": "category",
+    "vehicle_no": "category",
+    "status": "category",
+    "start_mileage": "float64",
+    "end_mileage": "float64",
+    "daily_mileage": "float64",
+    "uber_hire_mileage": "float64",
+    "loss_mileage": "float64",
+    "fare": "float64",
+    "tip": "float64",
+    "toll_fee": "float64",
+    "other_expenses": "float64",
+    "cash_collected": "float64",
+    "driver_salary": "float64",
+    "total_driver_salary": "float64",
+    "amount_to_ceekay": "float64",
+    "platform_fee": "float64",
+    "bank_deposit": "float64",
+    "cost_per_km": "float64",
+    "vehicle_running_cost": "float64",
+}
+
+
+@timed("transform")
+def normalise_daily_reports(df):
+    """Coerce daily_reports (or its rollups) to DAILY_REPORTS_SCHEMA in one pass.
+
+    Unparseable numbers become 0 and unparseable dates NaT, as the per-page
+    conversions did before. Rows come back sorted by date (NaT last, same-day
+    rows in sheet order) with their original index, ready for slice_dates().
+    """
+    columns = {}
+    for col, dtype in DAILY_REPORTS_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            columns[col] = df[col].astype(str).astype("category")
+        elif dtype.startswith("datetime64"):
+            columns[col] = pd.to_datetime(df[col], errors="coerce")
+        else:
+            columns[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+    df = df.assign(**columns)
+    if "date" in df.columns:
+        df = df.sort_values("date", kind="stable")
+    return df
+
+
+def slice_dates(df, start, end=None):
+    """Rows of a date-sorted frame with start <= date <= end (end defaults to start).
+
+    Uses binary search on the sorted date column, so it stays cheap however
+    much history there is. Row filters keep the order, so it also works on
+    filtered typed frames.
+    """
+    dates = df["date"]
+    first = dates.searchsorted(pd.Timestamp(start), side="left")
+    last = dates.searchsorted(pd.Timestamp(start if end is None else end), side="right")
+    return df.iloc[first:last]
+
+# -------------------------------------------------------------------
+# SHEET SNAPSHOT CACHE
+# -------------------------------------------------------------------
+# All page reads go through read_sheet(). Each session keeps the frame it last
+# loaded from the mirror and reloads it only when the mirror version moves on.
+# A snapshot taken during a rerun is kept for the rest of that rerun so every
+# page section sees the same rows, even if the mirror refreshes half way.
+# Loaded frames are shared across sessions per mirror version, so a burst of
+# sessions on the same data builds each frame once. A write from any session
+# moves the mirror version on, and every session reloads on its next rerun.
+def start_rerun():
+    """Mark the start of a script run; main() calls it before rendering a page."""
+    st.session_state["_snapshot_run"] = st.session_state.get("_snapshot_run", 0) + 1
+
+
+def _snapshot_store():
+    if "_sheet_snapshots" not in st.session_state:
+        st.session_state["_sheet_snapshots"] = {}
+    return st.session_state["_sheet_snapshots"]
+
+
+def _is_stale(entry, source):
+    if entry is None:
+        return True
+    return entry["run"] != st.session_state["_snapshot_run"] and entry["version"] != get_mirror().version(source)
+
+
+def _store_snapshot(key, source, value, version):
+    entry = {"value": value, "version": version, "run": st.session_state["_snapshot_run"], "source": source}
+    _snapshot_store()[key] = entry
+    return entry
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_snapshots():
+    # Process-wide {key: (value, version)}, shared by every session, plus one
+    # lock per key so concurrent sessions wait for a single load.
+    return {"entries": {}, "locks": {}, "lock": threading.Lock()}
+
+
+def _load_shared(key, source, load):
+    shared = _shared_snapshots()
+    with shared["lock"]:
+        key_lock = shared["locks"].setdefault(key, threading.Lock())
+    with key_lock:
+        entry = shared["entries"].get(key)
+        if entry is None or entry[1] != get_mirror().version(source):
+            entry = load()
+            shared["entries"][key] = entry
+        return entry
+
+
+def _cached_value(key, source, load):
+    # load() returns (value, mirror version of source). The value is shared by
+    # all sessions on that version, so callers must not modify it.
+    entry = _snapshot_store().get(key)
+    if _is_stale(entry, source):
+        entry = _store_snapshot(key, source, *_load_shared(key, source, load))
+    return entry["value"]
+
+
+def _cached_frame(key, source, load):
+    return _cached_value(key, source, load).copy()
+
+
+def snapshot_version(key, source):
+    """Mirror version of ``source`` that this session's snapshot ``key`` holds this run.
+
+    For a snapshot not loaded yet this run it is the version a read would load
+    now, so a memo keyed on it is at worst rebuilt once more than needed.
+    """
+    entry = _snapshot_store().get(key)
+    return get_mirror().version(source) if _is_stale(entry, source) else entry["version"]
+
+
+def read_sheet(name):
+    """Return a private copy of the mirrored worksheet as a DataFrame."""
+    return _cached_frame(name, name, lambda: get_mirror().read(name))
+
+
+def load_sheet_bundle(names):
+    """Bring several worksheets into this session's snapshots together.
+
+    Worksheets never mirrored yet are downloaded in one request, and all of
+    them are read from the same mirror state, so a page that needs several
+    sheets sees one consistent set. Later read_sheet() calls are served from
+    the snapshots.
+    """
+    store = _snapshot_store()
+    shared = _shared_snapshots()["entries"]
+    mirror = get_mirror()
+    stale = [name for name in names if _is_stale(store.get(name), name)]
+    to_read = []
+    for name in stale:
+        entry = shared.get(name)
+        if entry is not None and entry[1] == mirror.version(name):
+            _store_snapshot(name, name, *entry)
+        else:
+            to_read.append(name)
+    if to_read:
+        for name, entry in mirror.read_many(to_read).items():
+            shared[name] = entry
+            _store_snapshot(name, name, *entry)
+
+
+def read_daily_reports(columns=None):
+    """Return daily_reports typed by DAILY_REPORTS_SCHEMA; see read_sheet for the raw rows.
+
+    Pages that only need a few columns pass them as columns: only those are
+    read from the mirror and typed, and the result is cached per column set.
+    """
+    if columns is not None:
+        def load_columns():
+            df, version = get_mirror().read("daily_reports", columns=columns)
+            return normalise_daily_reports(df), version
+        return _cached_frame("_daily_reports_typed:" + ",".join(columns), "daily_reports", load_columns)
+
+    def load():
+        # Typed from the raw snapshot, so both always come from the same mirror version.
+        raw = _cached_value("daily_reports", "daily_reports", lambda: get_mirror().read("daily_reports"))
+        return normalise_daily_reports(raw), _snapshot_store()["daily_reports"]["version"]
+    return _cached_frame("_daily_reports_typed", "daily_reports", load)
+
+
+def read_rollups():
+    """Return the daily_reports rollups: one row per date, vehicle, driver and status."""
+    def load():
+        df, version = get_mirror().read_rollups()
+        return normalise_daily_reports(df), version
+    return _cached_frame("_rollup_daily", ROLLUP_SOURCE_SHEET, load)
+
+
+def read_service_state():
+    """Return SheetMirror.service_state() as held by this session's snapshots."""
+    mileage = _cached_value("_vehicle_mileage", ROLLUP_SOURCE_SHEET, lambda: get_mirror().vehicle_mileage())
+    services = _cached_value("_service_latest", SERVICE_SOURCE_SHEET, lambda: get_mirror().service_latest())
+    return _service_state(mileage, services)
+
+
+def _service_state(mileage, services):
+    state = {vehicle: {"current_mileage": km} for vehicle, km in mileage.items()}
+    for vehicle, latest in services.items():
+        state.setdefault(vehicle, {}).update(latest)
+    return state
+
+
+def vehicle_key(vehicle_no):
+    """Normalised vehicle number for matching across sheets: no dashes or spaces, upper case."""
+    return str(vehicle_no).replace("-", "").replace(" ", "").upper().strip()
+
+
+def _first_record_by(df, column, key):
+    index = {}
+    if column in df.columns:
+        for record in df.to_dict("records"):
+            index.setdefault(key(record[column]), record)
+    return index
+
+
+def vehicle_master_index():
+    """Return {vehicle_key: vehicle_master row} for the current snapshot. Treat it as read-only."""
+    def load():
+        df, version = get_mirror().read("vehicle_master")
+        return _first_record_by(df, "vehicle_no", vehicle_key), version
+    return _cached_value("_vehicle_master_index", "vehicle_master", load)
+
+
+def driver_index():
+    """Return {driver_name: drivers row} for the current snapshot, names stripped. Read-only."""
+    def load():
+        df, version = get_mirror().read("drivers")
+        index = _first_record_by(df, "driver_name", lambda name: str(name).strip())
+        index.pop("", None)
+        return index, version
+    return _cached_value("_driver_index", "drivers", load)
+
+
+def invalidate_sheet(name=None, full=False):
+    """Re-sync one worksheet (or all of them) into the mirror after a write.
+
+    daily_reports is brought up to date with a delta sync unless full=True.
+    """
+    names = SHEET_NAMES if name is None else [name]
+    store = _snapshot_store()
+    for cached in [k for k, entry in store.items() if entry["source"] in names]:
+        del store[cached]
+    try:
+        get_mirror().sync_many(names, full=full)
+    except Exception:
+        # The write itself went through; the background refresh catches up.
+        logger.exception("Sync of %s after write failed", ", ".join(names))
+
+
+def write_key(name, op, payload):
+    """Idempotency key for an update: the same sheet and payload give the same key."""
+    return hashlib.sha1(json.dumps([name, op, payload], default=str).encode("utf-8")).hexdigest()
+
+
+def form_nonce(form):
+    """Key of the submission ``form`` is rendering now; the same on every rerun until rotated."""
+    return st.session_state.setdefault(f"_form_nonce_{form}", f"{form}:{uuid.uuid4().hex}")
+
+
+def rotate_form_nonce(form):
+    """Give ``form`` a new submission key once its last submission is queued."""
+    st.session_state[f"_form_nonce_{form}"] = f"{form}:{uuid.uuid4().hex}"
+
+
+def _queue_write(name, op, payload, key=None):
+    # Stored durably first; sent right away unless the queue is backing off,
+    # in which case the background flusher delivers it later.
+    queue = get_write_queue()
+    queue.enqueue(name, op, payload, key=key)
+    queue.flush()
+    invalidate_sheet(name)
+
+
+def sheet_append_row(name, row, key=None):
+    """Append one row; ``key`` is the submission's form_nonce, without one every call appends."""
+    _queue_write(name, "append", [row], key=key)
+
+
+def sheet_update(name, a1_range, values):
+    payload = {"data": [{"range": a1_range, "values": values}], "value_input_option": "RAW"}
+    _queue_write(name, "update", payload, key=write_key(name, "update", payload))
+
+
+def sheet_batch_update(name, data):
+    """Write several ranges of one worksheet in a single API request."""
+    # USER_ENTERED stores values the same way update_cell() does.
+    payload = {"data": data, "value_input_option": "USER_ENTERED"}
+    _queue_write(name, "update", payload, key=write_key(name, "update", payload))
+
+
+def worksheet_values(name):
+    """get_all_values() straight from Google Sheets, for edits that address rows by number.
+
+    Raises QuotaExhausted when the read quota is used up; callers refuse the
+    edit rather than locate rows in the mirror's possibly older copy.
+    """
+    with perf_span("sheet", f"{name}.get_all_values") as span:
+        values = get_worksheet(name).get_all_values()
+        span.update(rows=len(values), bytes=payload_bytes(values))
+    return values
+
+
+def row_update_ranges(header, sheet_row, values):
+    """Build batch_update ranges that set {column: value} on one sheet row.
+
+    Adjacent columns share a range, so a decision touching status, admin_note,
+    platform_fee and bank_deposit becomes two ranges and one request.
+    """
+    runs = []
+    for col, value in sorted((header.index(column) + 1, value) for column, value in values.items()):
+        if runs and runs[-1][1] == col - 1:
+            runs[-1][1] = col
+            runs[-1][2].append(value)
+        else:
+            runs.append([col, col, [value]])
+    return [
+        {"range": f"{_column_letter(first)}{sheet_row}:{_column_letter(last)}{sheet_row}", "values": [cells]}
+        for first, last, cells in runs
+    ]
+
+
+# -------------------------------------------------------------------
+# CLOSED PERIODS
+# -------------------------------------------------------------------
+# A month that ended PERIOD_CLOSE_AFTER_DAYS ago, has no report waiting for
+# approval and has its electricity bill entered can no longer change, so it
+# is closed: its rollups, summed per vehicle, driver and status, and its
+# electricity bill are frozen into a local store that is only ever appended
+# to. Monthly pages read closed months from there and aggregate only the
+# rows after the last closed month. Months close oldest first, so the closed
+# months are always one unbroken run up to closed_through(). Closing is
+# permanent, so it only happens when the rows being frozen cannot be behind
+# the sheet: no write is waiting in the queue (or parked for the sheets a
+# close reads), and the mirror has just synced those sheets to the versions
+# this run shows. Otherwise the month is left open until a later render.
+PERIODS_PATH = Path(os.environ.get("CEEKAY_PERIODS_PATH", ".ceekay_cache/periods.sqlite"))
+PERIOD_CLOSE_AFTER_DAYS = 10
+SETTLED_STATUSES = ("Correct", "Incorrect")
+PERIOD_SOURCE_SHEETS = (ROLLUP_SOURCE_SHEET, "monthly_cash_flow")
+
+
+class PeriodStore:
+    """Append-only SQLite store of closed months.
+
+    close() writes a month's totals and electricity bill in one transaction;
+    nothing in the store is updated or deleted afterwards.
+    """
+
+    def __init__(self, path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._con = sqlite3.connect(str(path), check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error):
+            logger.warning("Cannot open period store %s, keeping closed periods in memory", path)
+            self._con = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.RLock()
+        self._snapshot = None
+        measures = "".join(f", {m} REAL NOT NULL DEFAULT 0" for m in ROLLUP_MEASURES)
+        with self._lock, self._con:
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS closed_months ("
+                "month TEXT PRIMARY KEY, electricity_bill REAL NOT NULL, closed_at TEXT NOT NULL)"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS closed_rollups ("
+                "month TEXT, vehicle_no TEXT, driver_name TEXT, status TEXT, "
+                f"trips INTEGER NOT NULL DEFAULT 0{measures}, "
+                "PRIMARY KEY (month, vehicle_no, driver_name, status))"
+            )
+
+    def snapshot(self):
+        """Return (closed months, closed rollups dated the 1st of their month).
+
+        Both frames are shared until the next close(), so callers must not modify them.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                months = pd.read_sql_query("SELECT * FROM closed_months ORDER BY month", self._con)
+                rollups = pd.read_sql_query("SELECT * FROM closed_rollups ORDER BY month", self._con)
+                rollups.insert(0, "date", pd.to_datetime(rollups.pop("month") + "-01"))
+                self._snapshot = (months, rollups)
+            return self._snapshot
+
+    def closed_through(self):
+        """Last day of the latest closed month, or None while nothing is closed."""
+        months = self.snapshot()[0]
+        if months.empty:
+            return None
+        return pd.Timestamp(months["month"].iloc[-1] + "-01") + pd.offsets.MonthEnd(0)
+
+    def close(self, month, rollups, electricity_bill):
+        """Freeze ``month`` ("YYYY-MM") from its rollup rows; False if it was already closed."""
+        keys = list(ROLLUP_KEYS[1:])
+        totals = rollups.groupby(keys, observed=True)[["trips", *ROLLUP_MEASURES]].sum().reset_index()
+        rows = [
+            (month, str(vehicle), str(driver), str(status), int(trips), *map(float, sums))
+            for vehicle, driver, status, trips, *sums in totals.itertuples(index=False)
+        ]
+        columns = ("month",) + ROLLUP_KEYS[1:] + ("trips",) + ROLLUP_MEASURES
+        with self._lock:
+            try:
+                with self._con:
+                    self._con.execute(
+                        "INSERT INTO closed_months (month, electricity_bill, closed_at) VALUES (?, ?, ?)",
+                        (month, float(electricity_bill), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                    )
+                    self._con.executemany(
+                        f"INSERT INTO closed_rollups ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})",
+                        rows,
+                    )
+            except sqlite3.IntegrityError:
+                return False
+            self._snapshot = None
+        logger.info("Closed %s: %d rollup rows frozen", month, len(rows))
+        return True
+
+
+@st.cache_resource(show_spinner=False)
+def get_period_store():
+    return PeriodStore(PERIODS_PATH)
+
+
+def _entered_electricity_bills():
+    bills = read_sheet("monthly_cash_flow")
+    if bills.empty or not {"month", "electricity_bill"} <= set(bills.columns):
+        return {}
+    amounts = pd.to_numeric(bills["electricity_bill"], errors="coerce")
+    return {
+        str(month).strip(): amount
+        for month, amount in zip(bills["month"], amounts)
+        if pd.notna(amount)
+    }
+
+
+def close_finished_periods(rollups):
+    """Close every month that is ready, oldest first, stopping at the first that is not."""
+    rollups = rollups.dropna(subset=["date"])
+    if rollups.empty:
+        return
+    store = get_period_store()
+    closed_through = store.closed_through()
+    if closed_through is None:
+        month = rollups["date"].iloc[0].normalize().replace(day=1)
+    else:
+        month = closed_through + pd.Timedelta(days=1)
+    cutoff = pd.Timestamp(date.today()) - pd.Timedelta(days=PERIOD_CLOSE_AFTER_DAYS)
+    bills = None
+    ready = []
+    while month + pd.offsets.MonthEnd(0) <= cutoff:
+        rows = slice_dates(rollups, month, month + pd.offsets.MonthEnd(0))
+        if not rows["status"].isin(SETTLED_STATUSES).all():
+            break
+        key = month.strftime("%Y-%m")
+        bills = _entered_electricity_bills() if bills is None else bills
+        # A month without reports may close without a bill, but keeps one entered for it.
+        if key not in bills and not rows.empty:
+            break
+        ready.append((key, rows, bills.get(key, 0.0)))
+        month += pd.offsets.MonthBegin(1)
+    if not ready or not _period_sources_current():
+        return
+    for key, rows, bill in ready:
+        store.close(key, rows, bill)
+
+
+def _period_sources_current():
+    # True when the rollups and bills this run holds are the sheet as it is
+    # now: nothing queued or parked for it, and a sync just now found no change.
+    queue = get_write_queue()
+    if queue.pending()[0] or any(write["sheet"] in PERIOD_SOURCE_SHEETS for write in queue.parked()):
+        return False
+    mirror = get_mirror()
+    try:
+        mirror.sync_many(PERIOD_SOURCE_SHEETS)
+    except Exception:
+        logger.warning("Could not sync before closing months; they stay open for now", exc_info=True)
+        return False
+    return (
+        snapshot_version("_rollup_daily", ROLLUP_SOURCE_SHEET) == mirror.version(ROLLUP_SOURCE_SHEET)
+        and snapshot_version("monthly_cash_flow", "monthly_cash_flow") == mirror.version("monthly_cash_flow")
+    )
+
+
+def period_rollups(rollups):
+    """read_rollups() with each closed month as one row per vehicle, driver and status.
+
+    Closes any month that has become ready first. Closed rows are dated the
+    1st of their month, so per-month totals are unchanged but day-level
+    filters only hold for open months.
+    """
+    close_finished_periods(rollups)
+    store = get_period_store()
+    closed_through = store.closed_through()
+    if closed_through is None:
+        return rollups
+    live = rollups.iloc[rollups["date"].searchsorted(closed_through, side="right"):]
+    return normalise_daily_reports(pd.concat([store.snapshot()[1], live], ignore_index=True))
+
+
+def closed_rollups_within(start, end):
+    """Closed rollups of the closed months lying wholly inside start..end.
+
+    Returns (rows, (first day, last day) they cover), or (rows, None) when no
+    closed month fits.
+    """
+    closed = get_period_store().snapshot()[1]
+    closed = closed[(closed["date"] >= pd.Timestamp(start)) & (closed["date"] + pd.offsets.MonthEnd(0) <= pd.Timestamp(end))]
+    if closed.empty:
+        return closed, None
+    return closed, (closed["date"].iloc[0], closed["date"].iloc[-1] + pd.offsets.MonthEnd(0))
+
+
+def closed_electricity_bills():
+    """{"YYYY-MM": electricity bill} frozen for every closed month."""
+    months = get_period_store().snapshot()[0]
+    return dict(zip(months["month"], months["electricity_bill"]))
+
+
+def period_is_closed(day):
+    closed_through = get_period_store().closed_through()
+    return closed_through is not None and pd.Timestamp(day) <= closed_through
+
 
 # -------------------------------------------------------------------
 # CHECK DRIVER LAST STATUS
 # -------------------------------------------------------------------
 def check_driver_status(driver_name):
-    df = pd.DataFrame(daily_sheet.get_all_records())
-    df = df[df["driver_name"] == driver_name]
-    if df.empty:
+    latest = get_mirror().driver_latest(driver_name)
+    if latest is None:
         return "No Reports"
-    last = df.iloc[-1]["status"]
-    return last
+    return latest["status"]
 
 
 
@@ -144,6 +1940,7 @@ ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "Mypa$$CEEKAY"
 
 def driver_auth(username, password):
+    drivers_df = read_sheet("drivers")
     row = drivers_df[
         (drivers_df["username"] == username) &
         (drivers_df["password"] == password)
@@ -160,25 +1957,22 @@ def sidebar_menu(user_type=None):
         render_centered_logo(145)
         st.markdown('<div class="ck-side-brand"><b>CEEKAY TOURS</b><span>Management Console</span></div>', unsafe_allow_html=True)
         st.divider()
-        icons={"Dashboard":"▦","Daily Entry":"＋","Profit Reports":"↗","Monthly Cash Flow":"↕","Vehicle Entry":"⚙","Vehicle Report":"◉","Settings":"☷","Logout":"↪"}
-        page=st.radio("Navigation",["Dashboard","Daily Entry","Profit Reports","Monthly Cash Flow","Vehicle Entry","Vehicle Report","Settings","Logout"],format_func=lambda x:f"{icons[x]}   {x}",label_visibility="collapsed")
+        icons={"Dashboard":"▦","Daily Entry":"＋","Profit Reports":"↗","Monthly Cash Flow":"↕","Vehicle Entry":"⚙","Vehicle Report":"◉","Settings":"☷","Diagnostics":"⏱","Logout":"↪"}
+        page=st.radio("Navigation",["Dashboard","Daily Entry","Profit Reports","Monthly Cash Flow","Vehicle Entry","Vehicle Report","Settings","Diagnostics","Logout"],format_func=lambda x:f"{icons[x]}   {x}",label_visibility="collapsed")
+        if st.button("↻ Refresh Data", use_container_width=True, key="refresh_sheet_data"):
+            invalidate_sheet(full=True)
+        render_pending_writes()
         st.divider()
-        st.caption("CEEKAY Tours • Admin Workspace")
-        return page
-
-def get_last_end_mileage(driver_name):
-    df = pd.DataFrame(daily_sheet.get_all_records())
-
-    if df.empty:
-        return 0
+        st.caption("CEEKAY Tours • Admin Workspace")
+        return page
 
-    df = df[df["driver_name"] == driver_name]
+def get_last_end_mileage(driver_name):
+    latest = get_mirror().driver_latest(driver_name)
 
-    if df.empty:
+    if latest is None:
         return 0
 
-    df = df.sort_values("date", ascending=False)
-    return int(df.iloc[0]["end_mileage"])
+    return int(_rollup_number(latest["end_mileage"]))
 
 # -------------------------------------------------------------------
 # DRIVER DAILY REPORT FORM
@@ -207,6 +2001,7 @@ def page_driver_form(driver):
         if k not in st.session_state:
             st.session_state[k] = v
 
+    submission = form_nonce("driver_daily_form")
     with st.form("driver_daily_form", clear_on_submit=False):
 
         st.session_state.report_date = st.date_input(
@@ -355,6 +2150,9 @@ def page_driver_form(driver):
         if st.session_state.cash is None:
             st.error("Cash collected is required.")
             return
+        if period_is_closed(st.session_state.report_date):
+            st.error("That month is closed. Please contact the office to correct a closed month.")
+            return
 
 
         daily = st.session_state.end - st.session_state.start
@@ -367,27 +2165,10 @@ def page_driver_form(driver):
         to_ceekay = st.session_state.cash - total_salary
 
         # 🔹 Load vehicle cost per km
-        master_df = pd.DataFrame(vehicle_master_sheet.get_all_records())
-
-        master_df["vehicle_no"] = (
-            master_df["vehicle_no"]
-            .astype(str)
-            .str.replace("-", "", regex=False)
-            .str.strip()
-        )
+        vehicle_row = vehicle_master_index().get(vehicle_key(driver["vehicle_no"]))
 
-        vehicle_no_clean = (
-            driver["vehicle_no"]
-            .replace("-", "")
-            .strip()
-        )
-
-        vehicle_row = master_df[
-           master_df["vehicle_no"] == vehicle_no_clean
-        ]
-
-        if not vehicle_row.empty:
-            cost_per_km = float(vehicle_row.iloc[0].get("cost_per_km", 0))
+        if vehicle_row is not None:
+            cost_per_km = float(vehicle_row.get("cost_per_km", 0))
         else:
             cost_per_km = 0
 
@@ -421,19 +2202,204 @@ def page_driver_form(driver):
             vehicle_running_cost
         ]
 
-        daily_sheet.append_row(new_row)
+        sheet_append_row("daily_reports", new_row, key=submission)
 
         st.success("Submitted successfully! Please wait for management approval.")
+        # Clearing the session also rotates the form's submission key.
         st.session_state.clear()
         st.rerun()
 
+# -------------------------------------------------------------------
+# PAGED TABLES
+# -------------------------------------------------------------------
+# Long tables are searched, sorted and cut into pages on the server and only
+# the visible page (and the chosen columns) is sent to the browser. The
+# searched and sorted rows are memoised with panel_cache under the caller's
+# inputs, which must identify the frame (data versions plus the filters that
+# produced it), so turning a page only slices.
+TABLE_PAGE_SIZES = (25, 50, 100, 250)
+
+
+def _table_sort_key(values):
+    # Raw sheet columns can mix numbers and text; those sort as text.
+    return values.astype(str) if values.dtype == object else values
+
+
+def _table_rows(df, columns, search, sort, descending):
+    rows = df
+    if search:
+        needle = search.strip().lower()
+        hits = pd.Series(False, index=rows.index)
+        for col in columns:
+            hits |= rows[col].astype(str).str.lower().str.contains(needle, regex=False)
+        rows = rows[hits]
+    if sort is not None:
+        rows = rows.sort_values(sort, ascending=not descending, kind="stable", key=_table_sort_key)
+    return rows
+
+
+def paged_table(key, df, inputs):
+    """Show ``df`` a page at a time with search, sort and column choice; ``df``'s own order is the default."""
+    if df.empty:
+        st.info("No rows to show.")
+        return
+    all_columns = list(df.columns)
+    c1, c2, c3 = st.columns([2.2, 1.4, 1.0])
+    search = c1.text_input("Search", key=f"{key}_search", placeholder="Search these rows")
+    sort = c2.selectbox(
+        "Sort by", [None] + all_columns, key=f"{key}_sort",
+        format_func=lambda col: "Default order" if col is None else col,
+    )
+    descending = c3.selectbox("Order", ["Descending", "Ascending"], key=f"{key}_order") == "Descending"
+    columns = st.multiselect("Columns", all_columns, default=all_columns, key=f"{key}_columns") or all_columns
+
+    rows = panel_cache(
+        f"table.{key}", inputs + (tuple(columns), search, sort, descending),
+        lambda: _table_rows(df, columns, search, sort, descending),
+    )
+    if rows.empty:
+        st.info("No rows match the search.")
+        return
+
+    p1, p2, p3 = st.columns([1.0, 1.0, 2.2])
+    size = p1.selectbox("Rows per page", TABLE_PAGE_SIZES, key=f"{key}_size")
+    pages = max((len(rows) - 1) // size + 1, 1)
+    page_key = f"{key}_page"
+    query = (tuple(columns), search, sort, descending)
+    if st.session_state.get(f"{key}_query") != query:
+        # A new search or sort starts again from the first page.
+        st.session_state[f"{key}_query"] = query
+        st.session_state[page_key] = 1
+    elif st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = p2.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    first = (page - 1) * size
+    last = min(first + size, len(rows))
+    p3.caption(f"Rows {first + 1:,}–{last:,} of {len(rows):,} • page {page} of {pages}")
+    st.dataframe(rows.iloc[first:last][columns], use_container_width=True, hide_index=True)
+
+# -------------------------------------------------------------------
+# EXPORTS
+# -------------------------------------------------------------------
+# Download buttons build their file only when clicked, in Streamlit's
+# download thread, and write it EXPORT_CHUNK_ROWS rows at a time to a file
+# under EXPORT_DIR, so no export holds a second copy of its rows as one big
+# string or workbook. Files are named after the export and a key for its
+# rows, so downloading the same rows again serves the file already on disk:
+# a page's frame is keyed by a digest of its contents, a whole worksheet by
+# the mirror's identity and the sheet's version. Excel files need openpyxl,
+# which is optional; without it only CSV is offered.
+EXPORT_DIR = Path(os.environ.get("CEEKAY_EXPORT_DIR", ".ceekay_cache/exports"))
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_CACHE_FILES = 32
+
+
+# An export source returns (key, open); open() returns (key, chunks) for the
+# rows it actually reads, and is only called when no file for key exists.
+def frame_export(df):
+    """Export source for a frame the page already holds."""
+    def source():
+        digest = hashlib.sha1(repr((list(df.columns), list(df.dtypes.astype(str)))).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+        key = digest.hexdigest()
+        return key, lambda: (key, (df.iloc[i:i + EXPORT_CHUNK_ROWS] for i in range(0, len(df), EXPORT_CHUNK_ROWS)))
+    return source
+
+
+def sheet_export(name):
+    """Export source for a whole mirrored worksheet, rows as stored, read from the mirror in chunks."""
+    mirror = get_mirror()
+
+    def open_chunks():
+        version, chunks = mirror.iter_chunks(name, EXPORT_CHUNK_ROWS)
+        return (mirror.identity, name, version), chunks
+    return lambda: ((mirror.identity, name, mirror.version(name)), open_chunks)
+
+
+def _write_csv(path, chunks):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, header=i == 0, index=False)
+
+
+def _write_xlsx(path, chunks, sheet_title):
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet(sheet_title[:31])
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            sheet.append([str(col) for col in chunk.columns])
+        cells = chunk.astype(object).where(chunk.notna(), None)
+        for row in cells.itertuples(index=False, name=None):
+            sheet.append(row)
+    book.save(path)
+
+
+def _prune_exports():
+    # Files still being written end in .part and are left alone.
+    files = [f for f in EXPORT_DIR.glob("*.*") if f.suffix != ".part"]
+    files.sort(key=lambda f: f.stat().st_mtime, reverse=True)
+    for old in files[EXPORT_CACHE_FILES:]:
+        old.unlink(missing_ok=True)
+
+
+def _export_path(stem, fmt, key):
+    digest = hashlib.sha1(repr((stem, key)).encode("utf-8")).hexdigest()[:16]
+    return EXPORT_DIR / f"{stem}-{digest}.{fmt}"
+
+
+def export_file(stem, fmt, source, perf=None):
+    """Path of the ``fmt`` ("csv" or "xlsx") file for ``source``, built now unless already on disk."""
+    key, open_chunks = source()
+    path = _export_path(stem, fmt, key)
+    if path.exists():
+        path.touch()
+        return path
+    # A sync between the two calls moves the key on; the file is named for what is read.
+    key, chunks = open_chunks()
+    path = _export_path(stem, fmt, key)
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+    with (perf or get_perf_recorder()).span("export", f"{stem}.{fmt}"):
+        try:
+            if fmt == "xlsx":
+                _write_xlsx(partial, chunks, stem)
+            else:
+                _write_csv(partial, chunks)
+            os.replace(partial, path)
+        finally:
+            partial.unlink(missing_ok=True)
+    _prune_exports()
+    return path
+
+
+def export_buttons(key, stem, source):
+    """CSV and Excel download buttons for ``source`` (see frame_export and sheet_export)."""
+    # The file is built in the download thread, outside this script run, so
+    # everything it needs is resolved here.
+    perf = get_perf_recorder()
+    c1, c2 = st.columns(2)
+    c1.download_button(
+        "⬇ Download CSV", lambda: export_file(stem, "csv", source, perf).read_bytes(),
+        file_name=f"{stem}.csv", mime="text/csv", key=f"{key}_csv",
+        on_click="ignore", use_container_width=True,
+    )
+    if openpyxl is None:
+        c2.caption("Excel downloads need the openpyxl package.")
+        return
+    c2.download_button(
+        "⬇ Download Excel", lambda: export_file(stem, "xlsx", source, perf).read_bytes(),
+        file_name=f"{stem}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key=f"{key}_xlsx", on_click="ignore", use_container_width=True,
+    )
+
 # -------------------------------------------------------------------
 # DRIVER SUMMARY
 # -------------------------------------------------------------------
 def page_driver_summary(driver):
     st.markdown("<div class='title-text'>📄 My Summary</div>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
+    df = read_sheet("daily_reports")
     df = df[df["driver_name"] == driver["driver_name"]]
 
     if df.empty:
@@ -441,23 +2407,31 @@ def page_driver_summary(driver):
         return
 
     df = df.sort_values("date", ascending=False)
-    st.dataframe(df)
+    paged_table(
+        "driver_summary", df,
+        (snapshot_version("daily_reports", "daily_reports"), driver["driver_name"]),
+    )
 
 # -------------------------------------------------------------------
 # DRIVER DASHBOARD
 # -------------------------------------------------------------------
+DRIVER_DASHBOARD_COLUMNS = (
+    "date", "driver_name", "status", "daily_mileage",
+    "uber_hire_mileage", "loss_mileage", "driver_salary", "tip",
+)
+
+
 def page_driver_dashboard(driver):
 
     st.markdown("<div class='title-text'>📊 Driver Dashboard</div>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
+    report_columns = DRIVER_DASHBOARD_COLUMNS
+    df = read_daily_reports(columns=report_columns)
 
     if df.empty:
         st.info("No data available")
         return
 
-    df["date"] = pd.to_datetime(df["date"])
-
     # Driver filter
     df = df[
         (df["driver_name"] == driver["driver_name"]) &
@@ -468,28 +2442,13 @@ def page_driver_dashboard(driver):
         st.warning("No approved reports yet.")
         return
 
-    # Convert numeric
-    cols = [
-        "daily_mileage",
-        "uber_hire_mileage",
-        "loss_mileage",
-        "driver_salary",
-        "tip"
-    ]
-
-    for c in cols:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
-
     # Date filter
     col1, col2 = st.columns(2)
 
     start_date = col1.date_input("From Date", df["date"].min())
     end_date = col2.date_input("To Date", df["date"].max())
 
-    df = df[
-        (df["date"] >= pd.to_datetime(start_date)) &
-        (df["date"] <= pd.to_datetime(end_date))
-    ]
+    df = slice_dates(df, start_date, end_date)
 
     if df.empty:
         st.info("No records for selected dates")
@@ -508,10 +2467,6 @@ def page_driver_dashboard(driver):
     uber_mileage = df["uber_hire_mileage"].sum()
     loss_mileage = df["loss_mileage"].sum()
 
-    # Convert numbers safely
-    df["driver_salary"] = pd.to_numeric(df["driver_salary"], errors="coerce").fillna(0)
-    df["tip"] = pd.to_numeric(df["tip"], errors="coerce").fillna(0)
-
     # Earnings totals
     total_salary = df["driver_salary"].sum()
     total_tips = df["tip"].sum()
@@ -593,29 +2548,31 @@ def page_driver_dashboard(driver):
     )
     st.subheader("Earnings Trend")
 
-    fig = px.line(
-        df,
-        x="date",
-        y="earnings",
-        markers=True,
-        title="Daily Earnings"
+    def earnings_figure():
+        points, period = downsample_dates(df, "date", "earnings")
+        return px.line(
+            points,
+            x="date",
+            y="earnings",
+            markers=True,
+            title=f"Earnings ({period} totals)" if period else "Daily Earnings"
+        )
+
+    version = snapshot_version("_daily_reports_typed:" + ",".join(DRIVER_DASHBOARD_COLUMNS), "daily_reports")
+    fig = cached_figure(
+        "driver_dashboard.earnings_trend", (version, driver["driver_name"], start_date, end_date), earnings_figure
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart("driver_dashboard.earnings_trend", fig, use_container_width=True)
 
     st.markdown("---")
     st.subheader("Top Driver of the Month")
 
-    df_all = pd.DataFrame(daily_sheet.get_all_records())
+    df_all = read_daily_reports(columns=report_columns)
 
     if not df_all.empty:
 
-        df_all["date"] = pd.to_datetime(df_all["date"], errors="coerce")
-
-        df_all = df_all[df_all["status"] == "Correct"]
-
-        df_all["driver_salary"] = pd.to_numeric(df_all["driver_salary"], errors="coerce").fillna(0)
-        df_all["tip"] = pd.to_numeric(df_all["tip"], errors="coerce").fillna(0)
+        df_all = df_all[df_all["status"] == "Correct"].copy()
 
         df_all["earnings"] = df_all["driver_salary"] + df_all["tip"]
 
@@ -627,7 +2584,7 @@ def page_driver_dashboard(driver):
         if not df_month.empty:
 
             leaderboard = (
-                df_month.groupby("driver_name")["earnings"]
+                df_month.groupby("driver_name", observed=True)["earnings"]
                 .sum()
                 .reset_index()
                 .sort_values("earnings", ascending=False)
@@ -665,12 +2622,17 @@ def page_driver_dashboard(driver):
 # -------------------------------------------------------------------
 # EARNINGS REPORT (Daily + Date Range)
 # -------------------------------------------------------------------
+EARNINGS_REPORT_COLUMNS = (
+    "date", "driver_name", "status", "daily_mileage", "uber_hire_mileage", "loss_mileage",
+    "fare", "tip", "toll_fee", "driver_salary", "total_driver_salary",
+)
+
+
 def page_earnings_report(user_type, driver=None):
 
     st.markdown("<div class='title-text'>📅 Earnings Report</div>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
-    df["date"] = pd.to_datetime(df["date"])
+    df = read_daily_reports(columns=EARNINGS_REPORT_COLUMNS)
     df = df[df["status"] == "Correct"]
 
 
@@ -686,7 +2648,7 @@ def page_earnings_report(user_type, driver=None):
     if mode == "Single Day":
 
         selected_date = st.date_input("Select Date")
-        f = df[df["date"] == pd.to_datetime(selected_date)]
+        f = slice_dates(df, selected_date)
 
         if f.empty:
             st.info("No records for this date.")
@@ -695,9 +2657,9 @@ def page_earnings_report(user_type, driver=None):
         st.subheader("Daily Summary")
 
         c1, c2, c3 = st.columns(3)
-        c1.metric("Total Mileage", f"{f['daily_mileage'].sum()} km")
-        c2.metric("Uber Mileage", f"{f['uber_hire_mileage'].sum()} km")
-        c3.metric("Loss Mileage", f"{f['loss_mileage'].sum()} km")
+        c1.metric("Total Mileage", f"{f['daily_mileage'].sum():,.0f} km")
+        c2.metric("Uber Mileage", f"{f['uber_hire_mileage'].sum():,.0f} km")
+        c3.metric("Loss Mileage", f"{f['loss_mileage'].sum():,.0f} km")
 
         c4, c5, c6 = st.columns(3)
         c4.metric("Fare", f"Rs {f['fare'].sum():,.2f}")
@@ -722,8 +2684,7 @@ def page_earnings_report(user_type, driver=None):
         start_date = col1.date_input("Start Date")
         end_date = col2.date_input("End Date")
 
-        mask = (df["date"] >= pd.to_datetime(start_date)) & (df["date"] <= pd.to_datetime(end_date))
-        f = df[mask]
+        f = slice_dates(df, start_date, end_date)
 
         if f.empty:
             st.info("No records found for this date range.")
@@ -732,9 +2693,9 @@ def page_earnings_report(user_type, driver=None):
         st.subheader("Date Range Summary")
 
         c1, c2, c3 = st.columns(3)
-        c1.metric("Total Mileage", f"{f['daily_mileage'].sum()} km")
-        c2.metric("Uber Mileage", f"{f['uber_hire_mileage'].sum()} km")
-        c3.metric("Loss Mileage", f"{f['loss_mileage'].sum()} km")
+        c1.metric("Total Mileage", f"{f['daily_mileage'].sum():,.0f} km")
+        c2.metric("Uber Mileage", f"{f['uber_hire_mileage'].sum():,.0f} km")
+        c3.metric("Loss Mileage", f"{f['loss_mileage'].sum():,.0f} km")
 
         c4, c5, c6 = st.columns(3)
         c4.metric("Fare", f"Rs {f['fare'].sum():,.2f}")
@@ -746,8 +2707,16 @@ def page_earnings_report(user_type, driver=None):
         c8.metric("Total Driver Salary", f"Rs {f['total_driver_salary'].sum():,.2f}")
 
         st.subheader("Chart View")
-        fig = px.line(f, x="date", y="fare", title="Fare Over Time")
-        st.plotly_chart(fig, use_container_width=True)
+
+        def fare_figure():
+            points, period = downsample_dates(f, "date", "fare")
+            title = f"Fare Over Time ({period} totals)" if period else "Fare Over Time"
+            return px.line(points, x="date", y="fare", title=title)
+
+        version = snapshot_version("_daily_reports_typed:" + ",".join(EARNINGS_REPORT_COLUMNS), "daily_reports")
+        viewer = driver["driver_name"] if user_type == "driver" else None
+        fig = cached_figure("earnings_report.fare_trend", (version, viewer, start_date, end_date), fare_figure)
+        plotly_chart("earnings_report.fare_trend", fig, use_container_width=True)
 
 # REMOVE detailed table block
 # st.subheader("Detailed Table")
@@ -758,182 +2727,235 @@ def page_earnings_report(user_type, driver=None):
 # CENTRAL VEHICLE SERVICE DATA FUNCTION
 # =====================================================
 
+@timed("transform")
 def get_vehicle_service_data():
+    """One row per vehicle_master row with its current mileage and, for every
+    SERVICE_TYPES key, the last serviced km (``<key>_km``), the interval in
+    use (``<key>_interval_km``) and the km the next service is due at
+    (``next_<key>``).
+    """
+    master_df = read_sheet("vehicle_master")
+    if master_df.empty:
+        return pd.DataFrame()
 
-    df_reports = pd.DataFrame(daily_sheet.get_all_records())
-    master_df = pd.DataFrame(vehicle_master_sheet.get_all_records())
-    expense_df = pd.DataFrame(vehicle_variable_sheet.get_all_records())
+    state = read_service_state()
+    records = []
+    for vehicle in master_df.to_dict("records"):
+        known = state.get(vehicle_key(vehicle.get("vehicle_no", "")), {})
+        record = dict(vehicle, current_mileage=known.get("current_mileage", 0.0))
+        for key, _, _, interval_column, default_interval, _ in SERVICE_TYPES:
+            interval = _rollup_number(vehicle[interval_column]) if interval_column in vehicle else default_interval
+            record[f"{key}_km"] = known.get(key, 0.0)
+            record[f"{key}_interval_km"] = interval
+            record[f"next_{key}"] = record[f"{key}_km"] + interval
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+def service_alerts(vehicle_data):
+    """[(level, title, detail)] for services overdue ("danger") or due soon ("warning")."""
+    alerts = []
+    for vehicle in vehicle_data.to_dict("records"):
+        current = vehicle["current_mileage"]
+        for key, label, _, _, _, margin in SERVICE_TYPES:
+            if vehicle[f"{key}_interval_km"] <= 0:
+                continue
+            due = vehicle[f"next_{key}"]
+            if current >= due:
+                alerts.append(("danger", f"{vehicle['vehicle_no']} - {label} OVERDUE", f"Current mileage: {current:,.0f} km"))
+            elif current >= due - margin:
+                alerts.append(("warning", f"{vehicle['vehicle_no']} - {label} Due Soon", f"Current mileage: {current:,.0f} km"))
+    return alerts
 
-    if df_reports.empty or master_df.empty:
-        return pd.DataFrame()
+# -------------------------------------------------------------------
+# VEHICLE PROFIT
+# -------------------------------------------------------------------
+@timed("transform")
+def compute_vehicle_profit(reports):
+    """Revenue, cost components and net profit per vehicle, in one pass.
+
+    ``reports`` are approved daily_reports (or rollup) rows, already filtered
+    by the caller. Variable costs are the vehicle's recorded expenses and
+    depreciation is one month's worth. The dashboard and the vehicle report
+    both use this, so their figures agree.
+    """
+    summary = reports.groupby("vehicle_no", observed=True).agg(
+        revenue=("fare", "sum"),
+        driver_salary=("driver_salary", "sum"),
+        toll_fee=("toll_fee", "sum"),
+        tip=("tip", "sum"),
+        platform_fee=("platform_fee", "sum"),
+        daily_mileage=("daily_mileage", "sum"),
+    ).reset_index()
+    summary["vehicle_no"] = summary["vehicle_no"].astype(str)
+    keys = summary["vehicle_no"].map(vehicle_key)
+
+    def by_vehicle(values):
+        # values is indexed by vehicle_key; vehicles without an entry get 0.
+        return pd.Series(values.reindex(keys).fillna(0).to_numpy(), index=summary.index)
+
+    master = pd.DataFrame.from_dict(vehicle_master_index(), orient="index")
 
-    # -----------------------
-    # Current Mileage
-    # -----------------------
-    df_reports["date"] = pd.to_datetime(df_reports["date"], errors="coerce")
-    df_reports["end_mileage"] = pd.to_numeric(
-        df_reports["end_mileage"], errors="coerce"
-    ).fillna(0)
-
-    df_reports = df_reports[df_reports["status"] == "Correct"]
-
-    latest_mileage = (
-        df_reports.sort_values("date")
-        .groupby("vehicle_no")
-        .tail(1)[["vehicle_no", "end_mileage"]]
-        .rename(columns={"end_mileage": "current_mileage"})
+    def master_number(col):
+        if col not in master.columns:
+            return pd.Series(0.0, index=summary.index)
+        return by_vehicle(pd.to_numeric(master[col], errors="coerce"))
+
+    variable_df = read_sheet("vehicle_variable_costs")
+    if not variable_df.empty and {"vehicle_no", "amount"} <= set(variable_df.columns):
+        amount = pd.to_numeric(variable_df["amount"], errors="coerce").fillna(0)
+        summary["variable_cost"] = by_vehicle(amount.groupby(variable_df["vehicle_no"].map(vehicle_key)).sum())
+    else:
+        summary["variable_cost"] = 0.0
+
+    useful_years = master_number("useful_years")
+    summary["driver_cost"] = summary["driver_salary"] + summary["toll_fee"] + summary["tip"]
+    summary["running_cost"] = summary["daily_mileage"] * master_number("cost_per_km")
+    summary["depreciation"] = (master_number("purchase_cost") / (useful_years * 12)).where(useful_years > 0, 0.0)
+    summary["total_cost"] = (
+        summary["driver_cost"]
+        + summary["platform_fee"]
+        + summary["running_cost"]
+        + summary["variable_cost"]
+        + summary["depreciation"]
     )
+    summary["net_profit"] = summary["revenue"] - summary["total_cost"]
+    return summary
 
-    # -----------------------
-    # Last Alignment & Air Filter
-    # -----------------------
-    if not expense_df.empty:
+# -------------------------------------------------------------------
+# ADMIN DASHBOARD PAGE
+# -------------------------------------------------------------------
+# The filters and panels run as one st.fragment, so changing the vehicle, the
+# dates or the figure mask reruns only the dashboard, not the whole script
+# (login, sidebar, sheet bundle). Each panel's data is memoised per session on
+# its own inputs, the filters it uses plus the data versions it reads, so such
+# a rerun only recomputes the panels whose inputs changed: the mask touches
+# none of them and a date change leaves the service alerts alone.
+RECENT_REPORT_COLUMNS = ("date", "vehicle_no", "status", "fare")
+
+
+def panel_cache(panel, inputs, build):
+    """Return build() for ``inputs``, reusing this session's last result for ``panel`` if its inputs match."""
+    memo = st.session_state.setdefault("_panel_cache", {})
+    entry = memo.get(panel)
+    if entry is None or entry[0] != inputs:
+        entry = memo[panel] = (inputs, build())
+    return entry[1]
+
+
+def _recent_approved_reports(start_date, end_date, selected_vehicle, limit=5):
+    reports = read_daily_reports(columns=RECENT_REPORT_COLUMNS)
+    reports = reports[reports["status"] == "Correct"]
+    reports = slice_dates(reports, start_date, end_date)
+    if selected_vehicle != "All Vehicles":
+        reports = reports[reports["vehicle_no"].astype(str).str.strip() == selected_vehicle]
+    return reports.sort_values(["date"], ascending=False).head(limit)
 
-        expense_df["description"] = expense_df["description"].astype(str)
 
-        # Alignment
-        align_df = expense_df[
-            expense_df["description"].str.contains("alignment", case=False, na=False)
-        ].copy()
+def _dashboard_reports():
+    """(approved dated rollups, vehicle options), or (None, why there is nothing to show)."""
+    df = read_rollups()
+    if df.empty:
+        return None, "No data available."
 
-        align_df["alignment_km"] = (
-            align_df["description"].str.extract(r'(\d+)').astype(float)
-        )
+    df = df[df["status"] == "Correct"]
+    if df.empty:
+        return None, "No approved data available."
+
+    df = df.dropna(subset=["date"])
+    if df.empty:
+        return None, "No valid dated records are available."
+
+    vehicle_options = ["All Vehicles"]
+    if "vehicle_no" in df.columns:
+        vehicle_options.extend(sorted({
+            str(vehicle).strip()
+            for vehicle in df["vehicle_no"].dropna().tolist()
+            if str(vehicle).strip()
+        }))
+    return df, vehicle_options
 
-        latest_align = (
-            align_df.sort_values("alignment_km")
-            .groupby("vehicle_no")
-            .last()
-            .reset_index()
-        )[["vehicle_no", "alignment_km"]]
 
-        # Air Filter
-        air_df = expense_df[
-            expense_df["description"].str.contains("air filter", case=False, na=False)
+def _dashboard_filter(df, start_date, end_date, selected_vehicle):
+    filtered = slice_dates(df, start_date, end_date).copy()
+    if selected_vehicle != "All Vehicles":
+        filtered = filtered[
+            filtered["vehicle_no"].astype(str).str.strip() == selected_vehicle
         ].copy()
+    return filtered
 
-        air_df["air_filter_km"] = (
-            air_df["description"].str.extract(r'(\d+)').astype(float)
-        )
 
-        latest_air = (
-            air_df.sort_values("air_filter_km")
-            .groupby("vehicle_no")
-            .last()
-            .reset_index()
-        )[["vehicle_no", "air_filter_km"]]
+def _dashboard_kpis(filtered):
+    total_revenue = filtered["fare"].sum()
+    total_salary = filtered["driver_salary"].sum()
+    total_platform = filtered["platform_fee"].sum()
+    running_cost = filtered["vehicle_running_cost"].sum()
+    total_cost = total_salary + total_platform + running_cost
+    net_profit = total_revenue - total_cost
+    total_mileage = filtered["daily_mileage"].sum()
+    return {
+        "total_revenue": total_revenue,
+        "total_salary": total_salary,
+        "total_platform": total_platform,
+        "running_cost": running_cost,
+        "total_cost": total_cost,
+        "net_profit": net_profit,
+        "total_mileage": total_mileage,
+        "profit_per_km": net_profit / total_mileage if total_mileage > 0 else 0,
+        "total_trips": int(filtered["trips"].sum()),
+    }
 
-    else:
-        latest_align = pd.DataFrame(columns=["vehicle_no", "alignment_km"])
-        latest_air = pd.DataFrame(columns=["vehicle_no", "air_filter_km"])
-
-    # -----------------------
-    # Clean vehicle numbers
-    # -----------------------
-    def clean(df):
-        if not df.empty:
-            df["vehicle_no"] = (
-                df["vehicle_no"]
-                .astype(str)
-                .str.replace("-", "", regex=False)
-                .str.strip()
-            )
-        return df
-
-    master_df = clean(master_df)
-    latest_mileage = clean(latest_mileage)
-    latest_align = clean(latest_align)
-    latest_air = clean(latest_air)
-
-    # -----------------------
-    # Merge all
-    # -----------------------
-    vehicle_data = master_df.merge(
-        latest_mileage, on="vehicle_no", how="left"
-    ).merge(
-        latest_align, on="vehicle_no", how="left"
-    ).merge(
-        latest_air, on="vehicle_no", how="left"
-    ).fillna(0)
-
-    # -----------------------
-    # Convert numeric columns
-    # -----------------------
-    numeric_cols = [
-        "alignment_km",
-        "alignment_interval_km",
-        "air_filter_km",
-        "air_filter_interval_km",
-        "current_mileage"
-    ]
 
-    for col in numeric_cols:
-        if col in vehicle_data.columns:
-            vehicle_data[col] = pd.to_numeric(
-                vehicle_data[col],
-                errors="coerce"
-            ).fillna(0)
-
-    # -----------------------
-    # Calculate next services
-    # -----------------------
-    vehicle_data["next_alignment"] = (
-        vehicle_data["alignment_km"]
-        + vehicle_data["alignment_interval_km"]
-    )
+def _dashboard_revenue_trend(filtered, start_date, end_date, selected_vehicle):
+    with perf_span("transform", "dashboard.revenue_trend") as span:
+        # Closed months wholly inside the range are read from the period
+        # store; only the rest of the range is grouped from the daily rollups.
+        closed, covered = closed_rollups_within(start_date, end_date)
+        closed = closed[closed["status"] == "Correct"]
+        if selected_vehicle != "All Vehicles":
+            closed = closed[closed["vehicle_no"].astype(str).str.strip() == selected_vehicle]
+        live = filtered
+        if covered:
+            live = filtered[(filtered["date"] < covered[0]) | (filtered["date"] > covered[1])]
+        trend = pd.concat([closed[["date", "fare"]], live[["date", "fare"]]], ignore_index=True)
+        trend["month"] = trend["date"].dt.to_period("M").dt.to_timestamp()
+        trend = trend.groupby("month", as_index=False)["fare"].sum()
+        span["rows"] = len(trend)
+    return trend
 
-    vehicle_data["next_air_filter"] = (
-        vehicle_data["air_filter_km"]
-        + vehicle_data["air_filter_interval_km"]
-    )
 
-    return vehicle_data
+def _toggle_overview_figures():
+    st.session_state.show_overview_figures = not st.session_state.show_overview_figures
+
 
-# -------------------------------------------------------------------
-# ADMIN DASHBOARD PAGE
-# -------------------------------------------------------------------
 def page_admin_dashboard():
     # Executive dashboard — UI rebuilt without changing the source data or core formulas.
-    df = pd.DataFrame(daily_sheet.get_all_records())
-    if df.empty:
-        st.warning("No data available.")
-        return
+    # Totals come from the daily rollups, so only the recent-entries list reads raw rows.
+    # The master and cost sheets the dashboard needs are loaded up front as one bundle.
+    load_sheet_bundle(("vehicle_master", "vehicle_variable_costs"))
+    if "show_overview_figures" not in st.session_state:
+        st.session_state.show_overview_figures = False
+    dashboard_panels()
 
-    if "status" in df.columns:
-        df = df[df["status"] == "Correct"].copy()
-    if df.empty:
-        st.warning("No approved data available.")
-        return
 
-    numeric_cols = [
-        "fare", "driver_salary", "platform_fee", "toll_fee", "tip",
-        "daily_mileage", "uber_hire_mileage", "loss_mileage",
-        "amount_to_ceekay", "bank_deposit", "vehicle_running_cost"
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-        else:
-            df[col] = 0.0
+@st.fragment
+def dashboard_panels():
+    # A fragment rerun runs outside main()'s handler, so it catches this itself.
+    try:
+        _dashboard_panels()
+    except QuotaExhausted:
+        st.warning(QUOTA_FIRST_LOAD_MESSAGE)
 
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date"])
-    if df.empty:
-        st.warning("No valid dated records are available.")
-        return
 
-    if "show_overview_figures" not in st.session_state:
-        st.session_state.show_overview_figures = False
+def _dashboard_panels():
+    rollup_version = snapshot_version("_rollup_daily", ROLLUP_SOURCE_SHEET)
+    df, vehicle_options = panel_cache("reports", (rollup_version,), _dashboard_reports)
+    if df is None:
+        st.warning(vehicle_options)
+        return
 
     top_left, top_mid, top_right = st.columns([4.4, 1.0, 2.6])
     with top_left:
-        vehicle_options = ["All Vehicles"]
-        if "vehicle_no" in df.columns:
-            vehicle_options.extend(sorted({
-                str(vehicle).strip()
-                for vehicle in df["vehicle_no"].dropna().tolist()
-                if str(vehicle).strip()
-            }))
         selected_vehicle = st.selectbox(
             "Vehicle",
             vehicle_options,
@@ -943,37 +2965,29 @@ def page_admin_dashboard():
 
     with top_mid:
         label = "Hide Figures" if st.session_state.show_overview_figures else "View Figures"
-        if st.button(label, key="overview_figure_toggle", use_container_width=True):
-            st.session_state.show_overview_figures = not st.session_state.show_overview_figures
-            st.rerun()
+        st.button(label, key="overview_figure_toggle", use_container_width=True, on_click=_toggle_overview_figures)
     with top_right:
         d1, d2 = st.columns(2)
         start_date = d1.date_input("From", df["date"].min().date(), key="dash_from")
         end_date = d2.date_input("To", df["date"].max().date(), key="dash_to")
 
-    filtered = df[
-        (df["date"] >= pd.to_datetime(start_date)) &
-        (df["date"] <= pd.to_datetime(end_date))
-    ].copy()
-
-    if selected_vehicle != "All Vehicles":
-        filtered = filtered[
-            filtered["vehicle_no"].astype(str).str.strip() == selected_vehicle
-        ].copy()
+    filters = (rollup_version, start_date, end_date, selected_vehicle)
+    filtered = panel_cache("filtered", filters, lambda: _dashboard_filter(df, start_date, end_date, selected_vehicle))
 
     if filtered.empty:
         st.info("No records found for the selected date range.")
         return
 
-    total_revenue = filtered["fare"].sum()
-    total_salary = filtered["driver_salary"].sum()
-    total_platform = filtered["platform_fee"].sum()
-    running_cost = filtered["vehicle_running_cost"].sum()
-    total_cost = total_salary + total_platform + running_cost
-    net_profit = total_revenue - total_cost
-    total_mileage = filtered["daily_mileage"].sum()
-    profit_per_km = net_profit / total_mileage if total_mileage > 0 else 0
-    total_trips = len(filtered)
+    kpis = panel_cache("kpis", filters, lambda: _dashboard_kpis(filtered))
+    total_revenue = kpis["total_revenue"]
+    total_salary = kpis["total_salary"]
+    total_platform = kpis["total_platform"]
+    running_cost = kpis["running_cost"]
+    total_cost = kpis["total_cost"]
+    net_profit = kpis["net_profit"]
+    total_mileage = kpis["total_mileage"]
+    profit_per_km = kpis["profit_per_km"]
+    total_trips = kpis["total_trips"]
 
     def private(value):
         return value if st.session_state.show_overview_figures else "********"
@@ -1007,93 +3021,64 @@ def page_admin_dashboard():
 
     st.markdown('<div class="ck-dashboard-gap"></div>', unsafe_allow_html=True)
 
-    trend = filtered.copy()
-    trend["month"] = trend["date"].dt.to_period("M").dt.to_timestamp()
-    trend = trend.groupby("month", as_index=False)["fare"].sum()
-    fig_revenue = px.line(trend, x="month", y="fare", markers=True)
-    fig_revenue.update_traces(line=dict(width=3, color="#079455"), marker=dict(size=7, color="#079455"), fill="tozeroy", fillcolor="rgba(7,148,85,.08)")
-    fig_revenue.update_layout(
-        margin=dict(l=12, r=12, t=18, b=10), height=300,
-        paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
-        xaxis_title="", yaxis_title="", showlegend=False,
-        font=dict(color="#475569", size=11),
-        xaxis=dict(showgrid=False), yaxis=dict(gridcolor="#edf2f7", tickprefix="Rs. ")
+    trend_inputs = filters + (get_period_store().closed_through(),)
+    trend = panel_cache(
+        "revenue_trend", trend_inputs,
+        lambda: _dashboard_revenue_trend(filtered, start_date, end_date, selected_vehicle),
     )
 
+    def revenue_figure():
+        fig = px.line(trend, x="month", y="fare", markers=True)
+        fig.update_traces(line=dict(width=3, color="#079455"), marker=dict(size=7, color="#079455"), fill="tozeroy", fillcolor="rgba(7,148,85,.08)")
+        fig.update_layout(
+            margin=dict(l=12, r=12, t=18, b=10), height=300,
+            paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+            xaxis_title="", yaxis_title="", showlegend=False,
+            font=dict(color="#475569", size=11),
+            xaxis=dict(showgrid=False), yaxis=dict(gridcolor="#edf2f7", tickprefix="Rs. ")
+        )
+        return fig
+
+    fig_revenue = cached_figure("dashboard.revenue_trend", trend_inputs, revenue_figure)
+
     profit_amount = max(net_profit, 0)
     expense_amount = max(total_cost, 0)
     donut_df = pd.DataFrame({"Category": ["Profit", "Expenses"], "Amount": [profit_amount, expense_amount]})
-    fig_profit = px.pie(donut_df, names="Category", values="Amount", hole=.67,
-                        color="Category", color_discrete_map={"Profit":"#12a36d", "Expenses":"#ef4444"})
-    fig_profit.update_traces(textinfo="none", hovertemplate="%{label}: Rs. %{value:,.0f}<extra></extra>")
-    profit_pct = profit_amount / (profit_amount + expense_amount) * 100 if (profit_amount + expense_amount) else 0
-    fig_profit.update_layout(
-        margin=dict(l=8,r=8,t=8,b=8), height=255, showlegend=True,
-        legend=dict(orientation="h", y=-.04, x=.5, xanchor="center"),
-        paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#475569", size=11),
-        annotations=[dict(text=f"<b>{profit_pct:.0f}%</b><br>Profit", x=.5,y=.5,font_size=20,showarrow=False,font_color="#0f172a")]
-    )
+
+    def profit_figure():
+        fig = px.pie(donut_df, names="Category", values="Amount", hole=.67,
+                            color="Category", color_discrete_map={"Profit":"#12a36d", "Expenses":"#ef4444"})
+        fig.update_traces(textinfo="none", hovertemplate="%{label}: Rs. %{value:,.0f}<extra></extra>")
+        profit_pct = profit_amount / (profit_amount + expense_amount) * 100 if (profit_amount + expense_amount) else 0
+        fig.update_layout(
+            margin=dict(l=8,r=8,t=8,b=8), height=255, showlegend=True,
+            legend=dict(orientation="h", y=-.04, x=.5, xanchor="center"),
+            paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#475569", size=11),
+            annotations=[dict(text=f"<b>{profit_pct:.0f}%</b><br>Profit", x=.5,y=.5,font_size=20,showarrow=False,font_color="#0f172a")]
+        )
+        return fig
+
+    fig_profit = cached_figure("dashboard.profit_split", filters, profit_figure)
 
     # Vehicle financial summary uses the SAME cost components as Vehicle Report.
     # Dashboard date filter applies to revenue/daily operating values. Existing vehicle
     # variable expenses and monthly depreciation follow the Vehicle Report logic.
-    vehicle_summary = filtered.groupby("vehicle_no", as_index=False).agg(
-        fare=("fare", "sum"),
-        driver_salary=("driver_salary", "sum"),
-        toll_fee=("toll_fee", "sum"),
-        tip=("tip", "sum"),
-        platform_fee=("platform_fee", "sum"),
-        daily_mileage=("daily_mileage", "sum"),
+    vehicle_summary = panel_cache(
+        "top_vehicles",
+        filters + (
+            snapshot_version("_vehicle_master_index", "vehicle_master"),
+            snapshot_version("vehicle_variable_costs", "vehicle_variable_costs"),
+        ),
+        lambda: compute_vehicle_profit(filtered).sort_values("net_profit", ascending=False),
     )
 
-    variable_df = pd.DataFrame(vehicle_variable_sheet.get_all_records())
-    if not variable_df.empty:
-        variable_df["amount"] = pd.to_numeric(variable_df.get("amount", 0), errors="coerce").fillna(0)
-    master_df = pd.DataFrame(vehicle_master_sheet.get_all_records())
-
-    vehicle_rows = []
-    for _, vr in vehicle_summary.iterrows():
-        vehicle_no = vr["vehicle_no"]
-        total_revenue_v = float(vr["fare"])
-        driver_cost_v = float(vr["driver_salary"] + vr["toll_fee"] + vr["tip"])
-        platform_fee_v = float(vr["platform_fee"])
-
-        master_match = master_df[master_df["vehicle_no"] == vehicle_no] if not master_df.empty and "vehicle_no" in master_df.columns else pd.DataFrame()
-        if not master_match.empty:
-            purchase_cost_v = num(master_match.iloc[0].get("purchase_cost", 0))
-            useful_years_v = num(master_match.iloc[0].get("useful_years", 0))
-            cost_per_km_v = num(master_match.iloc[0].get("cost_per_km", 0))
-            monthly_depreciation_v = purchase_cost_v / (useful_years_v * 12) if useful_years_v > 0 else 0.0
-        else:
-            cost_per_km_v = 0.0
-            monthly_depreciation_v = 0.0
-
-        running_cost_v = float(vr["daily_mileage"]) * cost_per_km_v
-        if not variable_df.empty and "vehicle_no" in variable_df.columns:
-            variable_cost_v = float(variable_df.loc[variable_df["vehicle_no"] == vehicle_no, "amount"].sum())
-        else:
-            variable_cost_v = 0.0
-
-        total_cost_v = driver_cost_v + platform_fee_v + running_cost_v + variable_cost_v + monthly_depreciation_v
-        net_profit_v = total_revenue_v - total_cost_v
-        vehicle_rows.append({
-            "vehicle_no": vehicle_no,
-            "revenue": total_revenue_v,
-            "total_cost": total_cost_v,
-            "net_profit": net_profit_v,
-        })
-
-    vehicle_summary = pd.DataFrame(vehicle_rows)
-    if not vehicle_summary.empty:
-        vehicle_summary = vehicle_summary.sort_values("net_profit", ascending=False)
-
     c1, c2, c3 = st.columns([1.7, 1.0, 1.25])
     with c1:
         st.markdown('<div class="ck-panel-title">Revenue Trend</div>', unsafe_allow_html=True)
-        st.plotly_chart(fig_revenue, use_container_width=True, config={"displayModeBar": False})
+        plotly_chart("dashboard.revenue_trend", fig_revenue, use_container_width=True, config={"displayModeBar": False})
     with c2:
         st.markdown('<div class="ck-panel-title">Profit vs Expense</div>', unsafe_allow_html=True)
-        st.plotly_chart(fig_profit, use_container_width=True, config={"displayModeBar": False})
+        plotly_chart("dashboard.profit_split", fig_profit, use_container_width=True, config={"displayModeBar": False})
     with c3:
         st.markdown('<div class="ck-panel-title">Top Performing Vehicles</div>', unsafe_allow_html=True)
         if vehicle_summary.empty:
@@ -1115,36 +3100,39 @@ def page_admin_dashboard():
         "Category": ["Vehicle Running Costs", "Driver Salary", "Platform Fee"],
         "Amount": [running_cost, total_salary, total_platform]
     })
-    fig_expense = px.pie(expense_df, names="Category", values="Amount", hole=.55)
-    fig_expense.update_traces(textinfo="none", hovertemplate="%{label}: Rs. %{value:,.0f}<extra></extra>")
-    fig_expense.update_layout(
-        margin=dict(l=4,r=4,t=4,b=4), height=240,
-        legend=dict(orientation="v", y=.5, x=1.0),
-        paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#475569", size=10)
-    )
 
-    recent = filtered.sort_values(["date"], ascending=False).head(5)
+    def expense_figure():
+        fig = px.pie(expense_df, names="Category", values="Amount", hole=.55)
+        fig.update_traces(textinfo="none", hovertemplate="%{label}: Rs. %{value:,.0f}<extra></extra>")
+        fig.update_layout(
+            margin=dict(l=4,r=4,t=4,b=4), height=240,
+            legend=dict(orientation="v", y=.5, x=1.0),
+            paper_bgcolor="rgba(0,0,0,0)", font=dict(color="#475569", size=10)
+        )
+        return fig
 
-    alerts = []
-    vehicle_data = get_vehicle_service_data()
-    if not vehicle_data.empty:
-        for _, row in vehicle_data.iterrows():
-            current = row.get("current_mileage", 0)
-            if row.get("alignment_interval_km", 0) > 0:
-                if current >= row.get("next_alignment", 0):
-                    alerts.append(("danger", f"{row['vehicle_no']} - Wheel Alignment OVERDUE", f"Current mileage: {current:,.0f} km"))
-                elif current >= row.get("next_alignment", 0) - 500:
-                    alerts.append(("warning", f"{row['vehicle_no']} - Wheel Alignment Due Soon", f"Current mileage: {current:,.0f} km"))
-            if row.get("air_filter_interval_km", 0) > 0:
-                if current >= row.get("next_air_filter", 0):
-                    alerts.append(("danger", f"{row['vehicle_no']} - Air Filter OVERDUE", f"Current mileage: {current:,.0f} km"))
-                elif current >= row.get("next_air_filter", 0) - 1000:
-                    alerts.append(("warning", f"{row['vehicle_no']} - Air Filter Due Soon", f"Current mileage: {current:,.0f} km"))
+    fig_expense = cached_figure("dashboard.expense_summary", filters, expense_figure)
+
+    recent = panel_cache(
+        "recent_entries",
+        (snapshot_version("_daily_reports_typed:" + ",".join(RECENT_REPORT_COLUMNS), "daily_reports"),) + filters[1:],
+        lambda: _recent_approved_reports(start_date, end_date, selected_vehicle),
+    )
+
+    alerts = panel_cache(
+        "service_alerts",
+        (
+            snapshot_version("vehicle_master", "vehicle_master"),
+            snapshot_version("_vehicle_mileage", ROLLUP_SOURCE_SHEET),
+            snapshot_version("_service_latest", SERVICE_SOURCE_SHEET),
+        ),
+        lambda: service_alerts(get_vehicle_service_data()),
+    )
 
     b1, b2, b3 = st.columns([1.15, 1.2, 1.15])
     with b1:
         st.markdown('<div class="ck-panel-title">Expense Summary</div>', unsafe_allow_html=True)
-        st.plotly_chart(fig_expense, use_container_width=True, config={"displayModeBar": False})
+        plotly_chart("dashboard.expense_summary", fig_expense, use_container_width=True, config={"displayModeBar": False})
     with b2:
         st.markdown('<div class="ck-panel-title">Recent Entries</div>', unsafe_allow_html=True)
         if recent.empty:
@@ -1172,19 +3160,10 @@ def page_admin_daily_profit():
 
     st.markdown("<h2>💰 Daily Profit Report</h2>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
-
-    numeric_cols = [
-    "fare", "driver_salary", "toll_fee", "tip", "other_expenses",
-    "cash_collected", "daily_mileage", "uber_hire_mileage",
-    "loss_mileage", "platform_fee", "amount_to_ceekay", "bank_deposit"
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    df = read_daily_reports()
 
     selected_date = st.date_input("Select a Date")
-    df_day = df[df["date"] == selected_date.strftime("%Y-%m-%d")]
+    df_day = slice_dates(df, selected_date)
 
     if df_day.empty:
         st.warning("No data found for this date.")
@@ -1198,12 +3177,6 @@ def page_admin_daily_profit():
     platform_fee = df_day["platform_fee"].sum()
     total_daily_mileage = df_day["daily_mileage"].sum()
 
-    
-    df_day["vehicle_running_cost"] = pd.to_numeric(
-    df_day.get("vehicle_running_cost", 0),
-    errors="coerce"
-    ).fillna(0)
-
     vehicle_cost = df_day["vehicle_running_cost"].sum()
     total_cost = total_salary + vehicle_cost + platform_fee
     profit = total_fare - total_cost
@@ -1222,10 +3195,10 @@ def page_admin_daily_profit():
     col3.metric("Profit", f"Rs. {profit:,.2f}")
     col4.metric("Cash Flow", f"Rs. {cash_flow:,.2f}")
 
-    st.metric("Mileage", f"{total_daily_mileage} km")
+    st.metric("Mileage", f"{total_daily_mileage:,.0f} km")
 
     st.subheader("Daily Breakdown")
-    st.dataframe(df_day)
+    paged_table("daily_breakdown", df_day, (snapshot_version("_daily_reports_typed", "daily_reports"), selected_date))
 
 # -------------------------------------------------------------------
 # ADMIN RANGE PROFIT REPORT
@@ -1234,26 +3207,13 @@ def page_admin_range_profit():
 
     st.markdown("<h2>📂 Range Profit Report</h2>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
-    
-
-    numeric_cols = [
-    "fare", "driver_salary", "toll_fee", "tip", "other_expenses",
-    "cash_collected", "daily_mileage", "uber_hire_mileage",
-    "loss_mileage", "platform_fee", "amount_to_ceekay", "bank_deposit"
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    df = read_daily_reports()
 
     col1, col2 = st.columns(2)
     from_date = col1.date_input("From Date")
     to_date = col2.date_input("To Date")
 
-    df_range = df[
-        (df["date"] >= from_date.strftime("%Y-%m-%d")) &
-        (df["date"] <= to_date.strftime("%Y-%m-%d"))
-    ]
+    df_range = slice_dates(df, from_date, to_date)
 
     if df_range.empty:
         st.warning("No data available for this range.")
@@ -1267,13 +3227,6 @@ def page_admin_range_profit():
     platform_fee = df_range["platform_fee"].sum()
     total_daily_mileage = df_range["daily_mileage"].sum()
 
-    
-
-    df_range["vehicle_running_cost"] = pd.to_numeric(
-    df_range.get("vehicle_running_cost", 0),
-    errors="coerce"
-    ).fillna(0)
-
     vehicle_cost = df_range["vehicle_running_cost"].sum()
     total_cost = total_salary + vehicle_cost + platform_fee
     profit = total_fare - total_cost
@@ -1292,10 +3245,15 @@ def page_admin_range_profit():
     col3.metric("Profit", f"Rs. {profit:,.2f}")
     col4.metric("Cash Flow", f"Rs. {cash_flow:,.2f}")
 
-    st.metric("Mileage", f"{total_daily_mileage} km")
+    st.metric("Mileage", f"{total_daily_mileage:,.0f} km")
 
     st.subheader("All Entries in Selected Range")
-    st.dataframe(df_range)
+    range_inputs = (snapshot_version("_daily_reports_typed", "daily_reports"), from_date, to_date)
+    paged_table("range_entries", df_range, range_inputs)
+    export_buttons("range_export", f"range_profit_{from_date}_{to_date}", frame_export(df_range))
+
+    st.caption("The whole daily_reports sheet as stored, every date and status:")
+    export_buttons("daily_reports_export", "daily_reports", sheet_export("daily_reports"))
 
 # -------------------------------------------------------------------
 # ADMIN MONTHLY PROFIT REPORT
@@ -1304,51 +3262,36 @@ def page_admin_monthly_profit():
 
     st.markdown("<h2>📆 Monthly Profit Summary</h2>", unsafe_allow_html=True)
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
-  
-
-    numeric_cols = [
-    "fare", "driver_salary", "toll_fee", "tip", "other_expenses",
-    "cash_collected", "daily_mileage", "uber_hire_mileage",
-    "loss_mileage", "platform_fee", "amount_to_ceekay", "bank_deposit"
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-
     selected_month = st.date_input("Select a Month")
-    month_str = selected_month.strftime("%Y-%m")
+    month_start = pd.Timestamp(selected_month.replace(day=1))
+    month_end = month_start + pd.offsets.MonthEnd(0)
 
-    df_month = df[df["date"].str.startswith(month_str)]
+    # Totals come from the daily rollups (frozen ones for closed months); raw
+    # rows are only loaded for the table.
+    rollups = period_rollups(read_rollups())
+    month_totals = slice_dates(rollups, month_start, month_end)
 
-    if df_month.empty:
+    if month_totals.empty:
         st.warning("No data found for this month.")
         return
 
-    total_fare = df_month["fare"].sum()
+    total_fare = month_totals["fare"].sum()
     total_salary = (
-    df_month["driver_salary"].sum()
-    + df_month["toll_fee"].sum()
-    + df_month["tip"].sum()
+    month_totals["driver_salary"].sum()
+    + month_totals["toll_fee"].sum()
+    + month_totals["tip"].sum()
     )
-    platform_fee = df_month["platform_fee"].sum()
-    total_daily_mileage = df_month["daily_mileage"].sum()
-
-    
-
-    df_month["vehicle_running_cost"] = pd.to_numeric(
-    df_month.get("vehicle_running_cost", 0),
-    errors="coerce"
-    ).fillna(0)
+    platform_fee = month_totals["platform_fee"].sum()
+    total_daily_mileage = month_totals["daily_mileage"].sum()
 
-    vehicle_cost = df_month["vehicle_running_cost"].sum()
+    vehicle_cost = month_totals["vehicle_running_cost"].sum()
     total_cost = total_salary + vehicle_cost + platform_fee
     profit = total_fare - total_cost
 
     cash_flow = (
-        df_month["amount_to_ceekay"].sum()
-        + df_month["bank_deposit"].sum()
-        - df_month["platform_fee"].sum()
+        month_totals["amount_to_ceekay"].sum()
+        + month_totals["bank_deposit"].sum()
+        - month_totals["platform_fee"].sum()
     )
 
     col1, col2 = st.columns(2)
@@ -1359,10 +3302,13 @@ def page_admin_monthly_profit():
     col3.metric("Profit", f"Rs. {profit:,.2f}")
     col4.metric("Cash Flow", f"Rs. {cash_flow:,.2f}")
 
-    st.metric("Mileage", f"{total_daily_mileage} km")
+    st.metric("Mileage", f"{total_daily_mileage:,.0f} km")
+
+    df = read_daily_reports()
+    df_month = slice_dates(df, month_start, month_end)
 
     st.subheader("All Entries for This Month")
-    st.dataframe(df_month)
+    paged_table("month_entries", df_month, (snapshot_version("_daily_reports_typed", "daily_reports"), month_start))
 
 # -------------------------------------------------------------------
 # PROFIT REPORTS MASTER PAGE
@@ -1385,11 +3331,11 @@ def page_profit_reports():
 def page_vehicle_report():
 
     # Main page heading is rendered centrally by the application shell.
-    vehicles = drivers_df["vehicle_no"].unique().tolist()
+    vehicles = read_sheet("drivers")["vehicle_no"].unique().tolist()
     selected_vehicle = st.selectbox("Select Vehicle", vehicles)
 
     # ---------------- Revenue Data ----------------
-    df_reports = pd.DataFrame(daily_sheet.get_all_records())
+    df_reports = read_rollups()
     df_reports = df_reports[
         (df_reports["vehicle_no"] == selected_vehicle) &
         (df_reports["status"] == "Correct")
@@ -1399,56 +3345,21 @@ def page_vehicle_report():
         st.warning("No revenue data available.")
         return
 
-    numeric_cols = ["fare", "driver_salary", "daily_mileage", "platform_fee"]
-    for col in numeric_cols:
-        df_reports[col] = pd.to_numeric(df_reports[col], errors="coerce").fillna(0)
-
-    total_revenue = df_reports["fare"].sum()
-    total_driver_salary = (
-    df_reports["driver_salary"].sum()
-    + df_reports["toll_fee"].sum()
-    + df_reports["tip"].sum()
-    )
-    total_platform_fee = df_reports["platform_fee"].sum()
-
-    total_mileage = df_reports["daily_mileage"].sum()
-        
-    # ---------------- Variable Costs ----------------
-    df_variable = pd.DataFrame(vehicle_variable_sheet.get_all_records())
-    df_variable["amount"] = pd.to_numeric(df_variable["amount"], errors="coerce").fillna(0)
-    df_variable = df_variable[df_variable["vehicle_no"] == selected_vehicle]
-
-    if not df_variable.empty:
+    # Same per-vehicle figures as the dashboard's Top Performing Vehicles.
+    profit = compute_vehicle_profit(df_reports).iloc[0]
+    total_revenue = profit["revenue"]
+    total_driver_salary = profit["driver_cost"]
+    total_platform_fee = profit["platform_fee"]
+    vehicle_running_cost = profit["running_cost"]
+    total_variable = profit["variable_cost"]
+    monthly_depreciation = profit["depreciation"]
+    total_cost = profit["total_cost"]
+    net_profit = profit["net_profit"]
+
+    df_variable = read_sheet("vehicle_variable_costs")
+    if not df_variable.empty and "vehicle_no" in df_variable.columns:
+        df_variable = df_variable[df_variable["vehicle_no"].map(vehicle_key) == vehicle_key(selected_vehicle)].copy()
         df_variable["amount"] = pd.to_numeric(df_variable["amount"], errors="coerce").fillna(0)
-        total_variable = df_variable["amount"].sum()
-    else:
-        total_variable = 0
-
-    # ---------------- Depreciation + Master Data ----------------
-    df_master = pd.DataFrame(vehicle_master_sheet.get_all_records())
-    df_master = df_master[df_master["vehicle_no"] == selected_vehicle]
-
-    if not df_master.empty:
-        purchase_cost = float(df_master.iloc[0]["purchase_cost"])
-        useful_years = float(df_master.iloc[0]["useful_years"])
-        cost_per_km = float(df_master.iloc[0].get("cost_per_km", 0))
-        monthly_depreciation = purchase_cost / (useful_years * 12)
-    else:
-        monthly_depreciation = 0
-        cost_per_km = 0
-
-    vehicle_running_cost = total_mileage * cost_per_km
-
-    # ---------------- Final Calculation ----------------
-    total_cost = (
-        total_driver_salary
-        + vehicle_running_cost
-        + total_variable
-        + total_platform_fee
-        + monthly_depreciation
-    )
-
-    net_profit = total_revenue - total_cost
 
     # ---------------- Display ----------------
     st.metric("Total Revenue", f"Rs. {total_revenue:,.2f}")
@@ -1467,9 +3378,13 @@ def page_vehicle_report():
     st.subheader("💰 Expense Details")
 
     if not df_variable.empty:
-        df_variable["amount"] = pd.to_numeric(df_variable["amount"], errors="coerce").fillna(0)
         df_variable = df_variable.sort_values("date", ascending=False)
-        st.dataframe(df_variable)
+        expense_inputs = (snapshot_version("vehicle_variable_costs", "vehicle_variable_costs"), selected_vehicle)
+        paged_table("vehicle_expenses", df_variable, expense_inputs)
+        export_buttons(
+            "vehicle_expenses_export", f"vehicle_expenses_{vehicle_key(selected_vehicle)}",
+            frame_export(df_variable),
+        )
     else:
         st.info("No expenses recorded for this vehicle.")
 
@@ -1484,14 +3399,15 @@ def page_vehicle_report():
 
         expense_summary = df_variable.groupby("category")["amount"].sum().reset_index()
 
-        fig = px.pie(
-            expense_summary,
-            names="category",
-            values="amount",
-            title="Expense Breakdown by Category"
-        )
+        with perf_span("figure", "vehicle_report.expense_breakdown"):
+            fig = px.pie(
+                expense_summary,
+                names="category",
+                values="amount",
+                title="Expense Breakdown by Category"
+            )
 
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart("vehicle_report.expense_breakdown", fig, use_container_width=True)
 
 
 
@@ -1524,18 +3440,20 @@ def page_vehicle_entry():
         purchase_date = st.date_input("Purchase Date")
         purchase_cost = st.number_input("Purchase Cost (Rs.)", min_value=0.0)
         useful_years = st.number_input("Useful Life (Years)", min_value=1.0, value=5.0)
+        vehicle_submission = form_nonce("add_vehicle")
 
         if st.button("Save Vehicle"):
 
             if vehicle_no == "":
                 st.error("Vehicle number required")
             else:
-                vehicle_master_sheet.append_row([
+                sheet_append_row("vehicle_master", [
                     vehicle_no,
                     purchase_date.strftime("%Y-%m-%d"),
                     purchase_cost,
                     useful_years
-                ])
+                ], key=vehicle_submission)
+                rotate_form_nonce("add_vehicle")
                 st.success("Vehicle added successfully!")
 
     # ------------------------------------------------
@@ -1545,7 +3463,7 @@ def page_vehicle_entry():
 
         st.subheader("Add Repair / Variable Expense")
 
-        vehicles = drivers_df["vehicle_no"].unique().tolist()
+        vehicles = read_sheet("drivers")["vehicle_no"].unique().tolist()
 
         if not vehicles:
             st.warning("No vehicles available")
@@ -1573,17 +3491,19 @@ def page_vehicle_entry():
 
             description = st.text_input("Description")
             amount = st.number_input("Amount (Rs.)", min_value=0.0)
+            expense_submission = form_nonce("add_expense")
 
 
             if st.button("Save Variable Expense"):
 
-                vehicle_variable_sheet.append_row([
+                sheet_append_row("vehicle_variable_costs", [
                     expense_date.strftime("%Y-%m-%d"),
                     selected_vehicle,
                     category,
                     description,
                     amount
-             ])
+             ], key=expense_submission)
+                rotate_form_nonce("add_expense")
 
                 st.success("Expense recorded!")
 
@@ -1595,7 +3515,7 @@ def page_admin_submissions():
 
     st.markdown("## 📁 Pending Driver Submissions")
 
-    df = pd.DataFrame(daily_sheet.get_all_records())
+    df = read_sheet("daily_reports")
 
     if df.empty:
         st.info("No submissions found.")
@@ -1608,6 +3528,7 @@ def page_admin_submissions():
         st.success("No pending submissions. All done!")
         return
 
+    header = list(df.columns)
     df["label"] = df.apply(
         lambda r: f"{r['driver_name']} | {r['date']} | Fare Rs.{num(r['fare']):,.2f}",
         axis=1
@@ -1665,51 +3586,67 @@ def page_admin_submissions():
 
     col1, col2 = st.columns(2)
 
+    def record_decision(status):
+        # One request per decision, so a failure cannot leave a half-updated row.
+        sheet_batch_update("daily_reports", row_update_ranges(header, sheet_row, {
+            "status": status,
+            "admin_note": admin_note,
+            "platform_fee": platform_fee,
+            "bank_deposit": bank_deposit,
+        }))
+
     if col1.button("✅ Approve"):
-        daily_sheet.update_cell(sheet_row, 19, "Correct")
-        daily_sheet.update_cell(sheet_row, 20, admin_note)
-        daily_sheet.update_cell(sheet_row, 22, platform_fee)
-        daily_sheet.update_cell(sheet_row, 23, bank_deposit)
+        record_decision("Correct")
 
         st.success("Submission approved successfully!")
         st.rerun()
 
     if col2.button("❌ Reject"):
-        daily_sheet.update_cell(sheet_row, 19, "Incorrect")
-        daily_sheet.update_cell(sheet_row, 20, admin_note)
-        daily_sheet.update_cell(sheet_row, 22, platform_fee)
-        daily_sheet.update_cell(sheet_row, 23, bank_deposit)
+        record_decision("Incorrect")
 
         st.error("Submission rejected.")
         st.rerun()
 
+    # ---------------- Bulk approval ----------------
+    st.markdown("---")
+    st.markdown("## ✅ Bulk Approve")
+    st.caption("Approves the selected submissions as they are, keeping their existing note, platform fee and bank deposit.")
+
+    select_all = st.checkbox(f"Select all {len(df)} pending submissions", key="bulk_approve_all")
+    bulk_rows = st.multiselect(
+        "Submissions to approve",
+        df.index.tolist(),
+        default=df.index.tolist() if select_all else [],
+        format_func=lambda i: df.at[i, "label"],
+        key=f"bulk_approve_rows_{select_all}",
+    )
+
+    if st.button(f"✅ Approve {len(bulk_rows)} Selected", disabled=not bulk_rows, key="bulk_approve_button"):
+        data = []
+        for index in bulk_rows:
+            data.extend(row_update_ranges(header, index + 2, {"status": "Correct"}))
+        sheet_batch_update("daily_reports", data)
+
+        st.success(f"{len(bulk_rows)} submissions approved.")
+        st.rerun()
+
 # -------------------------------------------------------------------
 # ADMIN DAILY ENTRY — DIRECT ENTRY, NO DRIVER LOGIN / APPROVAL REQUIRED
 # -------------------------------------------------------------------
 def page_admin_daily_entry():
 
     # Main page heading/subtitle are rendered centrally by the application shell.
-    drivers_current = pd.DataFrame(drivers_sheet.get_all_records())
+    drivers_current = driver_index()
 
-    if drivers_current.empty or "driver_name" not in drivers_current.columns:
+    if not drivers_current:
         st.warning("No drivers are available in the drivers sheet.")
         return
 
-    drivers_current = drivers_current.copy()
-    drivers_current["driver_name"] = drivers_current["driver_name"].astype(str).str.strip()
-    drivers_current = drivers_current[drivers_current["driver_name"] != ""]
-
-    if drivers_current.empty:
-        st.warning("No valid drivers are available in the drivers sheet.")
-        return
-
-    driver_names = drivers_current["driver_name"].tolist()
+    driver_names = list(drivers_current)
 
     # Quick-entry header: driver first, vehicle is still taken automatically.
     selected_driver_name = st.selectbox("Driver", driver_names)
-    selected_driver = drivers_current[
-        drivers_current["driver_name"] == selected_driver_name
-    ].iloc[0].to_dict()
+    selected_driver = drivers_current[selected_driver_name]
 
     vehicle_no = str(selected_driver.get("vehicle_no", "")).strip()
     st.caption(f"Assigned Vehicle: {vehicle_no or 'Not assigned'}")
@@ -1720,6 +3657,7 @@ def page_admin_daily_entry():
     if "daily_entry_form_version" not in st.session_state:
         st.session_state.daily_entry_form_version = 0
     form_version = st.session_state.daily_entry_form_version
+    submission = form_nonce("admin_daily_entry_form")
 
     def clean_default_number(value):
         """Show stored mileage cleanly without unnecessary .00."""
@@ -1907,6 +3845,10 @@ def page_admin_daily_entry():
         st.error("End mileage cannot be lower than start mileage.")
         return
 
+    if period_is_closed(report_date):
+        st.error(f"{report_date:%Y-%m} is closed; entries can no longer be added to it.")
+        return
+
     # Existing operational calculations are intentionally unchanged.
     daily_mileage = max(0, end_mileage - start_mileage)
     loss_mileage = daily_mileage - uber_hire_mileage
@@ -1936,25 +3878,11 @@ def page_admin_daily_entry():
         st.info("Review the payment figures above, then click Save Daily Entry when ready.")
         return
 
-    master_df = pd.DataFrame(vehicle_master_sheet.get_all_records())
     cost_per_km = 0.0
 
-    if not master_df.empty and "vehicle_no" in master_df.columns:
-        master_df = master_df.copy()
-        master_df["vehicle_no_clean"] = (
-            master_df["vehicle_no"]
-            .astype(str)
-            .str.replace("-", "", regex=False)
-            .str.replace(" ", "", regex=False)
-            .str.upper()
-            .str.strip()
-        )
-        selected_vehicle_clean = (
-            vehicle_no.replace("-", "").replace(" ", "").upper().strip()
-        )
-        vehicle_row = master_df[master_df["vehicle_no_clean"] == selected_vehicle_clean]
-        if not vehicle_row.empty:
-            cost_per_km = num(vehicle_row.iloc[0].get("cost_per_km", 0))
+    vehicle_row = vehicle_master_index().get(vehicle_key(vehicle_no))
+    if vehicle_row is not None:
+        cost_per_km = num(vehicle_row.get("cost_per_km", 0))
 
     vehicle_running_cost = daily_mileage * cost_per_km
 
@@ -1986,7 +3914,8 @@ def page_admin_daily_entry():
         vehicle_running_cost
     ]
 
-    daily_sheet.append_row(new_row)
+    sheet_append_row("daily_reports", new_row, key=submission)
+    rotate_form_nonce("admin_daily_entry_form")
 
     st.success(
         f"Daily entry saved successfully. Total Driver Payable: Rs. {total_driver_salary:,.2f} | "
@@ -2003,32 +3932,27 @@ def page_admin_daily_entry():
 # MONTHLY CASH FLOW
 # -------------------------------------------------------------------
 def page_monthly_cash_flow():
-    reports = pd.DataFrame(daily_sheet.get_all_records())
+    # One rollup row per date, vehicle, driver and status carries every sum
+    # needed here; closed months come as one frozen row per vehicle and driver.
+    reports = period_rollups(read_rollups())
 
     if reports.empty:
         st.info("No daily reports are available yet.")
         return
 
-    reports = reports.copy()
-    if "status" in reports.columns:
-        reports = reports[reports["status"].astype(str).str.lower() == "correct"]
-
-    reports["date"] = pd.to_datetime(reports.get("date"), errors="coerce")
-    reports = reports.dropna(subset=["date"])
+    reports = reports[reports["status"].astype(str).str.lower() == "correct"]
+    reports = reports.dropna(subset=["date"]).copy()
     if reports.empty:
         st.info("No valid dated reports are available.")
         return
 
-    reports["fare"] = pd.to_numeric(reports.get("fare", 0), errors="coerce").fillna(0)
-
     # Vehicle filter: default is All Vehicles so the existing totals remain unchanged.
     vehicle_options = ["All Vehicles"]
-    if "vehicle_no" in reports.columns:
-        available_vehicles = sorted({
-            str(v).strip() for v in reports["vehicle_no"].dropna().tolist()
-            if str(v).strip()
-        })
-        vehicle_options.extend(available_vehicles)
+    available_vehicles = sorted({
+        str(v).strip() for v in reports["vehicle_no"].dropna().tolist()
+        if str(v).strip()
+    })
+    vehicle_options.extend(available_vehicles)
 
     selected_cashflow_vehicle = st.selectbox(
         "Vehicle",
@@ -2047,25 +3971,17 @@ def page_monthly_cash_flow():
         return
 
     # Cash and bank amounts are kept separate for the cash-flow breakdown.
-    reports["cash_flow_cash"] = pd.to_numeric(
-        reports.get("amount_to_ceekay", 0), errors="coerce"
-    ).fillna(0)
-    reports["cash_flow_bank"] = pd.to_numeric(
-        reports.get("bank_deposit", 0), errors="coerce"
-    ).fillna(0)
+    reports["cash_flow_cash"] = reports["amount_to_ceekay"]
+    reports["cash_flow_bank"] = reports["bank_deposit"]
 
     # Use the actual total driver payable already stored by the daily-entry logic.
-    if "total_driver_salary" in reports.columns:
-        reports["driver_payable"] = pd.to_numeric(reports["total_driver_salary"], errors="coerce").fillna(0)
+    if "total_driver_salary" in get_mirror().header(ROLLUP_SOURCE_SHEET):
+        reports["driver_payable"] = reports["total_driver_salary"]
     else:
-        salary = pd.to_numeric(reports.get("driver_salary", 0), errors="coerce").fillna(0)
-        toll = pd.to_numeric(reports.get("toll_fee", 0), errors="coerce").fillna(0)
-        tip = pd.to_numeric(reports.get("tip", 0), errors="coerce").fillna(0)
-        reports["driver_payable"] = salary + toll + tip
+        reports["driver_payable"] = reports["driver_salary"] + reports["toll_fee"] + reports["tip"]
 
     reports["month"] = reports["date"].dt.strftime("%Y-%m")
-    platform_fee = pd.to_numeric(reports.get("platform_fee", 0), errors="coerce").fillna(0)
-    reports["platform_fee_cash"] = platform_fee
+    reports["platform_fee_cash"] = reports["platform_fee"]
 
     monthly = reports.groupby("month", as_index=False).agg(
         monthly_revenue=("fare", "sum"),
@@ -2084,9 +4000,9 @@ def page_monthly_cash_flow():
         - monthly["platform_fee"]
     )
 
-    elec = pd.DataFrame(monthly_cash_flow_sheet.get_all_records())
+    elec = read_sheet("monthly_cash_flow")
     if elec.empty:
-        elec = pd.DataFrame(columns=["month", "electricity_bill", "updated_at", "note"])
+        elec = pd.DataFrame(columns=MONTHLY_CASH_FLOW_HEADER)
     if "electricity_bill" not in elec.columns:
         elec["electricity_bill"] = 0
     elec["electricity_bill"] = pd.to_numeric(elec["electricity_bill"], errors="coerce").fillna(0)
@@ -2094,43 +4010,56 @@ def page_monthly_cash_flow():
 
     monthly = monthly.merge(elec[["month", "electricity_bill"]], on="month", how="left")
     monthly["electricity_bill"] = monthly["electricity_bill"].fillna(0)
+    closed_bills = closed_electricity_bills()
+    closed = monthly["month"].isin(closed_bills)
+    monthly.loc[closed, "electricity_bill"] = monthly.loc[closed, "month"].map(closed_bills)
     monthly["real_cash_flow"] = monthly["cash_before_electricity"] - monthly["electricity_bill"]
     monthly = monthly.sort_values("month")
 
     st.markdown("### Add / Update Electricity Bill")
-    month_options = sorted(monthly["month"].unique().tolist(), reverse=True)
-    selected_month = st.selectbox("Month", month_options, key="cashflow_bill_month")
-    current_bill = float(monthly.loc[monthly["month"] == selected_month, "electricity_bill"].iloc[0])
-    bill_raw = st.text_input(
-        "Electricity Bill (Rs.)",
-        value="" if current_bill == 0 else f"{current_bill:g}",
-        placeholder="Enter monthly electricity bill",
-        key="cashflow_electricity_bill",
-    )
-    note = st.text_input("Note", placeholder="Optional", key="cashflow_note")
+    # Closed months keep the bill they were closed with.
+    month_options = sorted(set(monthly["month"]) - set(closed_bills), reverse=True)
+    if closed_bills:
+        st.caption(f"Months up to {max(closed_bills)} are closed; their figures and electricity bills are final.")
+    if month_options:
+        selected_month = st.selectbox("Month", month_options, key="cashflow_bill_month")
+        current_bill = float(monthly.loc[monthly["month"] == selected_month, "electricity_bill"].iloc[0])
+        bill_raw = st.text_input(
+            "Electricity Bill (Rs.)",
+            value="" if current_bill == 0 else f"{current_bill:g}",
+            placeholder="Enter monthly electricity bill",
+            key="cashflow_electricity_bill",
+        )
+        note = st.text_input("Note", placeholder="Optional", key="cashflow_note")
+        bill_submission = form_nonce("cashflow_bill")
 
-    if st.button("Save Electricity Bill", use_container_width=True, key="save_cashflow_bill"):
-        try:
-            bill = float(str(bill_raw).replace(",", "").strip() or 0)
-            if bill < 0:
-                raise ValueError
-        except ValueError:
-            st.error("Please enter a valid electricity bill amount.")
-            return
+        if st.button("Save Electricity Bill", use_container_width=True, key="save_cashflow_bill"):
+            try:
+                bill = float(str(bill_raw).replace(",", "").strip() or 0)
+                if bill < 0:
+                    raise ValueError
+            except ValueError:
+                st.error("Please enter a valid electricity bill amount.")
+                return
 
-        values = monthly_cash_flow_sheet.get_all_values()
-        row_to_update = None
-        for idx, row in enumerate(values[1:], start=2):
-            if row and str(row[0]).strip() == selected_month:
-                row_to_update = idx
-                break
-        now_txt = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if row_to_update:
-            monthly_cash_flow_sheet.update(f"A{row_to_update}:D{row_to_update}", [[selected_month, bill, now_txt, note]])
-        else:
-            monthly_cash_flow_sheet.append_row([selected_month, bill, now_txt, note])
-        st.success(f"Electricity bill saved for {selected_month}.")
-        st.rerun()
+            try:
+                values = worksheet_values("monthly_cash_flow")
+            except QuotaExhausted:
+                st.error(QUOTA_EDIT_MESSAGE)
+                return
+            row_to_update = None
+            for idx, row in enumerate(values[1:], start=2):
+                if row and str(row[0]).strip() == selected_month:
+                    row_to_update = idx
+                    break
+            now_txt = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if row_to_update:
+                sheet_update("monthly_cash_flow", f"A{row_to_update}:D{row_to_update}", [[selected_month, bill, now_txt, note]])
+            else:
+                sheet_append_row("monthly_cash_flow", [selected_month, bill, now_txt, note], key=bill_submission)
+            rotate_form_nonce("cashflow_bill")
+            st.success(f"Electricity bill saved for {selected_month}.")
+            st.rerun()
 
     st.markdown("---")
     latest = monthly.iloc[-1]
@@ -2151,14 +4080,28 @@ def page_monthly_cash_flow():
 
     st.markdown("### Monthly Cash Flow Trend")
     chart_df = monthly.copy()
-    fig = px.line(
-        chart_df, x="month", y="real_cash_flow", markers=True,
-        labels={"month": "Month", "real_cash_flow": "Real Cash Flow (Rs.)"},
-        title="Real Monthly Cash Flow"
+
+    def cash_flow_figure():
+        fig = px.line(
+            chart_df, x="month", y="real_cash_flow", markers=True,
+            labels={"month": "Month", "real_cash_flow": "Real Cash Flow (Rs.)"},
+            title="Real Monthly Cash Flow"
+        )
+        fig.update_layout(margin=dict(l=10, r=10, t=50, b=10), separators=".,")
+        fig.update_yaxes(tickformat=",.0f")
+        return fig
+
+    fig = cached_figure(
+        "monthly_cash_flow.trend",
+        (
+            snapshot_version("_rollup_daily", ROLLUP_SOURCE_SHEET),
+            snapshot_version("monthly_cash_flow", "monthly_cash_flow"),
+            get_period_store().closed_through(),
+            selected_cashflow_vehicle,
+        ),
+        cash_flow_figure,
     )
-    fig.update_layout(margin=dict(l=10, r=10, t=50, b=10), separators=".,")
-    fig.update_yaxes(tickformat=",.0f")
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart("monthly_cash_flow.trend", fig, use_container_width=True)
 
     st.markdown("### Monthly Cash Flow Details")
     display = monthly.rename(columns={
@@ -2176,19 +4119,33 @@ def page_monthly_cash_flow():
     # Gross bank amount is an internal calculation only; hide it from the user.
     if "bank_amount_gross" in display.columns:
         display = display.drop(columns=["bank_amount_gross"])
+    # Downloads keep the numbers as numbers.
+    cash_flow_export = frame_export(display.copy())
     for col in ["Monthly Revenue", "Driver Payable", "Platform Fee", "Cash", "Bank", "Total Cash Flow", "Cash Flow Before Electricity", "Electricity Bill", "Real Cash Flow"]:
         display[col] = display[col].map(lambda x: f"{x:,.2f}")
     st.dataframe(display, use_container_width=True, hide_index=True)
+    stem = "monthly_cash_flow" if selected_cashflow_vehicle == "All Vehicles" else f"monthly_cash_flow_{vehicle_key(selected_cashflow_vehicle)}"
+    export_buttons("cash_flow_export", stem, cash_flow_export)
 
 
 # -------------------------------------------------------------------
 # SETTINGS — SAFE MASTER DATA EDITOR
 # -------------------------------------------------------------------
-def _settings_row_values(ws):
-    values = ws.get_all_values()
+def _settings_row_values(name):
+    """Return (header, rows, live) for a settings editor.
+
+    The rows come from Google Sheets so a save addresses the right sheet row.
+    When the read quota is used up the local copy is shown instead, with
+    live False: the editor must not save from it.
+    """
+    try:
+        values, live = worksheet_values(name), True
+    except QuotaExhausted:
+        values, live = get_mirror().values(name), False
+        st.warning("Google Sheets request limit reached: showing the local copy, and saving is off until it resets. Please try again shortly.")
     if not values:
-        return [], []
-    return values[0], values[1:]
+        return [], [], live
+    return values[0], values[1:], live
 
 
 def _setting_text(value):
@@ -2220,7 +4177,7 @@ def page_settings():
     # ---------------------------------------------------------------
     with tab1:
         st.markdown("### Drivers & Vehicle Assignment")
-        headers, rows = _settings_row_values(drivers_sheet)
+        headers, rows, live = _settings_row_values("drivers")
         if not rows:
             st.info("No drivers are available in the drivers sheet.")
         else:
@@ -2239,7 +4196,7 @@ def page_settings():
                 vehicle_no = c2.text_input("Assigned Vehicle", value=_setting_text(row[3]))
                 username = c1.text_input("Username (legacy field)", value=_setting_text(row[1]))
                 password = c2.text_input("Password (legacy field)", value=_setting_text(row[2]))
-                save_driver = st.form_submit_button("Save Driver Settings", use_container_width=True)
+                save_driver = st.form_submit_button("Save Driver Settings", use_container_width=True, disabled=not live)
 
             if save_driver:
                 if not driver_name.strip():
@@ -2247,7 +4204,8 @@ def page_settings():
                 elif not vehicle_no.strip():
                     st.error("Assigned vehicle is required.")
                 else:
-                    drivers_sheet.update(
+                    sheet_update(
+                        "drivers",
                         f"A{sheet_row}:D{sheet_row}",
                         [[driver_name.strip(), username.strip(), password.strip(), vehicle_no.strip()]],
                     )
@@ -2261,7 +4219,7 @@ def page_settings():
     # ---------------------------------------------------------------
     with tab2:
         st.markdown("### Vehicle Master Settings")
-        headers, rows = _settings_row_values(vehicle_master_sheet)
+        headers, rows, live = _settings_row_values("vehicle_master")
         if not rows:
             st.info("No vehicles are available in vehicle_master.")
         else:
@@ -2288,13 +4246,14 @@ def page_settings():
                 purchase_cost = c2.number_input("Purchase Cost (Rs.)", min_value=0.0, value=_setting_number(row[9]), step=10000.0)
                 useful_years = c1.number_input("Useful Life (Years)", min_value=0.0, value=_setting_number(row[10]), step=1.0)
                 cost_per_km = c2.number_input("Running Cost per KM (Rs.)", min_value=0.0, value=_setting_number(row[11]), step=1.0)
-                save_vehicle = st.form_submit_button("Save Vehicle Settings", use_container_width=True)
+                save_vehicle = st.form_submit_button("Save Vehicle Settings", use_container_width=True, disabled=not live)
 
             if save_vehicle:
                 if not vehicle_no.strip():
                     st.error("Vehicle number is required.")
                 else:
-                    vehicle_master_sheet.update(
+                    sheet_update(
+                        "vehicle_master",
                         f"A{sheet_row}:L{sheet_row}",
                         [[
                             vehicle_no.strip(), license_date.strip(), insurance_date.strip(),
@@ -2313,14 +4272,21 @@ def page_settings():
     # ---------------------------------------------------------------
     with tab3:
         st.markdown("### Monthly Electricity Settings")
-        headers, rows = _settings_row_values(monthly_cash_flow_sheet)
+        headers, rows, live = _settings_row_values("monthly_cash_flow")
+        # Closed months keep the bill they were closed with, as on Monthly Cash Flow.
+        closed_bills = closed_electricity_bills()
+        if closed_bills:
+            st.caption(f"Months up to {max(closed_bills)} are closed; their electricity bills are final.")
+        options = {
+            f"{r[0] if len(r) > 0 else 'Month'}": i + 2
+            for i, r in enumerate(rows)
+            if not (r and str(r[0]).strip() in closed_bills)
+        }
         if not rows:
             st.info("No electricity bills have been recorded yet. Add the first one from Monthly Cash Flow.")
+        elif not options:
+            st.info("Every recorded month is closed.")
         else:
-            options = {
-                f"{r[0] if len(r) > 0 else 'Month'}": i + 2
-                for i, r in enumerate(rows)
-            }
             selected_month_label = st.selectbox("Select Month", list(options.keys()), key="settings_electricity_month")
             sheet_row = options[selected_month_label]
             row = rows[sheet_row - 2]
@@ -2330,60 +4296,157 @@ def page_settings():
                 month = st.text_input("Month", value=_setting_text(row[0]), help="Use YYYY-MM format")
                 bill = st.number_input("Electricity Bill (Rs.)", min_value=0.0, value=_setting_number(row[1]), step=100.0)
                 note = st.text_input("Note", value=_setting_text(row[3]))
-                save_electricity = st.form_submit_button("Save Electricity Settings", use_container_width=True)
+                save_electricity = st.form_submit_button("Save Electricity Settings", use_container_width=True, disabled=not live)
 
             if save_electricity:
-                now_txt = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                monthly_cash_flow_sheet.update(
-                    f"A{sheet_row}:D{sheet_row}",
-                    [[month.strip(), bill, now_txt, note.strip()]],
-                )
-                st.success("Electricity settings updated successfully.")
-                st.rerun()
+                if month.strip() in closed_bills:
+                    st.error(f"{month.strip()} is closed; its electricity bill can no longer change.")
+                else:
+                    now_txt = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    sheet_update(
+                        "monthly_cash_flow",
+                        f"A{sheet_row}:D{sheet_row}",
+                        [[month.strip(), bill, now_txt, note.strip()]],
+                    )
+                    st.success("Electricity settings updated successfully.")
+                    st.rerun()
 
 # -------------------------------------------------------------------
-# MAIN APP — SINGLE ADMIN ACCOUNT
+# DIAGNOSTICS — ADMIN ONLY
 # -------------------------------------------------------------------
-if "is_admin_logged" not in st.session_state:
-    st.session_state.is_admin_logged = False
-
-if not st.session_state.is_admin_logged:
-    left, center, right = st.columns([1, 1.05, 1])
-    with center:
-        with st.container(border=True):
-            if not render_centered_logo(140):
-                st.markdown('<div class="login-logo">CT</div>', unsafe_allow_html=True)
-            st.markdown('<div class="login-name" style="text-align:center">CEEKAY Tours</div><div class="login-sub" style="text-align:center">Business Management Console<br>Administrator Access</div>', unsafe_allow_html=True)
-            username=st.text_input("Username",placeholder="Enter username",key="admin_login_username")
-            password=st.text_input("Password",type="password",placeholder="Enter password",key="admin_login_password")
-            if st.button("Sign in",use_container_width=True,key="admin_login_button"):
-                if username==ADMIN_USERNAME and password==ADMIN_PASSWORD:
-                    st.session_state.is_admin_logged=True
-                    st.rerun()
-                else:
-                    st.error("Incorrect username or password.")
-            st.markdown('<div class="ck-login-note">Single administrator account • Existing CEEKAY Tours database</div>',unsafe_allow_html=True)
-else:
-    page=sidebar_menu()
-    meta={
-      "Dashboard":("Business Dashboard","Revenue, profitability, mileage and fleet health at a glance."),
-      "Daily Entry":("Daily Operations","Record driver and trip income directly from the admin workspace."),
-      "Profit Reports":("Profit Reports","Review daily, date-range and monthly business performance."),
-      "Monthly Cash Flow":("Monthly Cash Flow","Track monthly cash available after driver payments and electricity."),
-      "Vehicle Entry":("Vehicle Costs & Service","Maintain vehicle master data, running costs and service expenses."),
-      "Vehicle Report":("Vehicle Report","Review vehicle-level income, expenses, mileage and profitability."),
-      "Settings":("Settings","Update master values and configuration stored in the CEEKAY Tours Google Sheet.")
-    }
-    if page!="Logout":
-        title,sub=meta[page]
-        st.markdown(f'<div class="ck-page-kicker">CEEKAY TOURS • MANAGEMENT</div><div class="finance-title">{title}</div><div class="finance-subtitle">{sub}</div>',unsafe_allow_html=True)
-    if page=="Dashboard": page_admin_dashboard()
-    elif page=="Daily Entry": page_admin_daily_entry()
-    elif page=="Profit Reports": page_profit_reports()
-    elif page=="Monthly Cash Flow": page_monthly_cash_flow()
-    elif page=="Vehicle Entry": page_vehicle_entry()
-    elif page=="Vehicle Report": page_vehicle_report()
-    elif page=="Settings": page_settings()
-    elif page=="Logout":
-        st.session_state.clear()
+SPAN_COLUMNS = ["kind", "name", "ms", "rows", "bytes", "page", "run", "error"]
+
+
+def _span_summary(spans):
+    """One row per (kind, name): call count, total / p50 / p95 / max time, rows and bytes."""
+    summary = spans.groupby(["kind", "name"]).agg(
+        calls=("ms", "size"),
+        total_ms=("ms", "sum"),
+        p50_ms=("ms", "median"),
+        p95_ms=("ms", lambda ms: ms.quantile(0.95)),
+        max_ms=("ms", "max"),
+        rows=("rows", lambda rows: rows.sum(min_count=1)),
+        bytes=("bytes", lambda sizes: sizes.sum(min_count=1)),
+    )
+    return summary.sort_values("total_ms", ascending=False).reset_index()
+
+
+def page_diagnostics():
+    perf = get_perf_recorder()
+    st.caption(
+        f"Timings from this server process: the last {PERF_PAGE_HISTORY} runs of each page and the "
+        f"last {PERF_SPAN_HISTORY} timed steps. Bytes are estimated from the JSON size of the values. "
+        "Set CEEKAY_PERF_LOG=1 to also log every step as a JSON line."
+    )
+    if st.button("Reset Timings", key="diagnostics_reset"):
+        perf.reset()
         st.rerun()
+
+    st.markdown("### Page Timings")
+    pages = perf.page_timings()
+    if not pages:
+        st.info("No page has been timed yet. Open a page and come back.")
+        return
+    page_rows = []
+    for page, times in pages.items():
+        times = pd.Series(times)
+        page_rows.append({
+            "page": page, "runs": len(times), "p50_ms": times.median(),
+            "p95_ms": times.quantile(0.95), "last_ms": times.iloc[-1],
+        })
+    st.dataframe(
+        pd.DataFrame(page_rows).sort_values("p95_ms", ascending=False),
+        use_container_width=True, hide_index=True,
+    )
+
+    spans = pd.DataFrame(perf.recent_spans()).reindex(columns=SPAN_COLUMNS)
+    sheet_calls = spans[spans["kind"] == "sheet"]
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Sheet Calls", f"{len(sheet_calls):,}")
+    c2.metric("Sheet Time", f"{sheet_calls['ms'].sum() / 1000:,.2f} s")
+    c3.metric("Data Transferred", f"{sheet_calls['bytes'].sum() / 2**20:,.2f} MB")
+
+    quota = get_sheets_governor().status()
+    q1, q2, q3 = st.columns(3)
+    q1.metric("Read Quota Left", f"{quota['read'][0]} / {SHEETS_READS_PER_MINUTE}")
+    q2.metric("Write Quota Left", f"{quota['write'][0]} / {SHEETS_WRITES_PER_MINUTE}")
+    q3.metric("Requests Held Back", f"{quota['read'][1] + quota['write'][1]:,}")
+
+    st.markdown("### Where The Time Goes")
+    st.dataframe(_span_summary(spans), use_container_width=True, hide_index=True)
+
+    st.markdown("### Latest Page Run")
+    runs = spans.dropna(subset=["run"])
+    if runs.empty:
+        st.info("No page run has finished yet.")
+        return
+    page = st.selectbox("Page", sorted(runs["page"].unique()), key="diagnostics_page")
+    latest = runs[runs["run"] == runs.loc[runs["page"] == page, "run"].max()]
+    st.dataframe(
+        latest[["kind", "name", "ms", "rows", "bytes", "error"]].sort_values("ms", ascending=False),
+        use_container_width=True, hide_index=True,
+    )
+
+# -------------------------------------------------------------------
+# MAIN APP — SINGLE ADMIN ACCOUNT
+# -------------------------------------------------------------------
+# Streamlit runs this file as __main__; importing it (benchmarks, tools) only
+# defines the pages.
+def main():
+    start_rerun()
+
+    if "is_admin_logged" not in st.session_state:
+        st.session_state.is_admin_logged = False
+
+    if not st.session_state.is_admin_logged:
+        left, center, right = st.columns([1, 1.05, 1])
+        with center:
+            with st.container(border=True):
+                if not render_centered_logo(140):
+                    st.markdown('<div class="login-logo">CT</div>', unsafe_allow_html=True)
+                st.markdown('<div class="login-name" style="text-align:center">CEEKAY Tours</div><div class="login-sub" style="text-align:center">Business Management Console<br>Administrator Access</div>', unsafe_allow_html=True)
+                username=st.text_input("Username",placeholder="Enter username",key="admin_login_username")
+                password=st.text_input("Password",type="password",placeholder="Enter password",key="admin_login_password")
+                if st.button("Sign in",use_container_width=True,key="admin_login_button"):
+                    if username==ADMIN_USERNAME and password==ADMIN_PASSWORD:
+                        st.session_state.is_admin_logged=True
+                        st.rerun()
+                    else:
+                        st.error("Incorrect username or password.")
+                st.markdown('<div class="ck-login-note">Single administrator account • Existing CEEKAY Tours database</div>',unsafe_allow_html=True)
+    else:
+        page=sidebar_menu()
+        meta={
+          "Dashboard":("Business Dashboard","Revenue, profitability, mileage and fleet health at a glance."),
+          "Daily Entry":("Daily Operations","Record driver and trip income directly from the admin workspace."),
+          "Profit Reports":("Profit Reports","Review daily, date-range and monthly business performance."),
+          "Monthly Cash Flow":("Monthly Cash Flow","Track monthly cash available after driver payments and electricity."),
+          "Vehicle Entry":("Vehicle Costs & Service","Maintain vehicle master data, running costs and service expenses."),
+          "Vehicle Report":("Vehicle Report","Review vehicle-level income, expenses, mileage and profitability."),
+          "Settings":("Settings","Update master values and configuration stored in the CEEKAY Tours Google Sheet."),
+          "Diagnostics":("Diagnostics","Page timings, sheet calls and data transferred by this server.")
+        }
+        if page!="Logout":
+            title,sub=meta[page]
+            st.markdown(f'<div class="ck-page-kicker">CEEKAY TOURS • MANAGEMENT</div><div class="finance-title">{title}</div><div class="finance-subtitle">{sub}</div>',unsafe_allow_html=True)
+            render_data_freshness()
+        if page=="Logout":
+            st.session_state.clear()
+            st.rerun()
+        with perf_span("page", page):
+            try:
+                if page=="Dashboard": page_admin_dashboard()
+                elif page=="Daily Entry": page_admin_daily_entry()
+                elif page=="Profit Reports": page_profit_reports()
+                elif page=="Monthly Cash Flow": page_monthly_cash_flow()
+                elif page=="Vehicle Entry": page_vehicle_entry()
+                elif page=="Vehicle Report": page_vehicle_report()
+                elif page=="Settings": page_settings()
+                elif page=="Diagnostics": page_diagnostics()
+            except QuotaExhausted:
+                # Only reached before the first copy of a sheet has been downloaded.
+                st.warning(QUOTA_FIRST_LOAD_MESSAGE)
+
+
+if __name__ == "__main__":
+    main()
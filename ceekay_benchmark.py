@@ -0,0 +1,192 @@
+"""Headless benchmarks for the CEEKAY report pages.
+
+Builds a synthetic fleet with ceekay_fixtures, points the app at it through
+LocalBackend and runs each page function in Streamlit's AppTest, so no
+browser, server or Google credentials are involved::
+
+    python ceekay_benchmark.py --vehicles 20 --years 5 --shifts 3
+    python ceekay_benchmark.py --json bench.json        # keep the results
+    python ceekay_benchmark.py --baseline bench.json    # exit 1 on a regression
+
+Each page gets a cold run (new session, shared frame cache cleared), a
+median over warm reruns, the peak Python memory of a cold run (tracemalloc)
+and the number of sheet calls it made. The mirror's first download of the
+workbook is reported on its own line.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+from ceekay_fixtures import make_workbook, populate
+from ceekay_storage import LOCAL_CALLS, LocalBackend
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# (label, ceekay_app function called with no arguments)
+BENCHMARKS = (
+    ("admin dashboard", "page_admin_dashboard"),
+    ("monthly cash flow", "page_monthly_cash_flow"),
+    ("vehicle report", "page_vehicle_report"),
+    ("vehicle service data", "get_vehicle_service_data"),
+    ("daily profit", "page_admin_daily_profit"),
+    ("range profit", "page_admin_range_profit"),
+    ("monthly profit", "page_admin_monthly_profit"),
+)
+SYNC_LABEL = "mirror initial sync"
+SCRIPT = """
+import sys
+sys.path.insert(0, {repo!r})
+import ceekay_app
+ceekay_app.start_rerun()
+{call}
+"""
+# Importing the app renders nothing; the background refresh is pushed out so
+# a refresh cannot land in the middle of a measurement.
+SETUP_CALL = "ceekay_app.MIRROR_REFRESH_SECONDS = 24 * 3600"
+SYNC_CALL = "ceekay_app.get_mirror().sync_many(ceekay_app.SHEET_NAMES, only_missing=True)"
+# A cold run rebuilds everything the app shares between sessions: frames,
+# cached data and figures. Panel caches live in session state, and every
+# AppTest is a new session, so they start empty anyway.
+RESET_CALL = (
+    "ceekay_app._shared_snapshots.clear()\n"
+    "ceekay_app.st.cache_data.clear()\n"
+    "ceekay_app._figure_cache.clear()"
+)
+
+
+def _sheet_calls():
+    return sum(LOCAL_CALLS.values())
+
+
+def _new_test(call, timeout):
+    return AppTest.from_string(SCRIPT.format(repo=str(REPO_DIR), call=call), default_timeout=timeout)
+
+
+def _timed_run(at):
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+def prepare(workdir, vehicles, years, shifts, seed):
+    """Write the synthetic workbook and point the app's storage settings at ``workdir``."""
+    data = workdir / "sheets"
+    workbook = make_workbook(vehicles, years, shifts, seed=seed)
+    populate(LocalBackend(data), workbook)
+    os.environ.update({
+        "CEEKAY_BACKEND": "local",
+        "CEEKAY_LOCAL_DATA": str(data),
+        "CEEKAY_MIRROR_PATH": str(workdir / "mirror.sqlite"),
+        "CEEKAY_WRITE_QUEUE_PATH": str(workdir / "writes.sqlite"),
+        "CEEKAY_PERIODS_PATH": str(workdir / "periods.sqlite"),
+    })
+    return {title: len(rows) - 1 for title, rows in workbook.items()}
+
+
+def run_benchmarks(repeat=5, timeout=600, only=None):
+    results = {}
+    _timed_run(_new_test(SETUP_CALL, timeout))
+    before = _sheet_calls()
+    at = _new_test(SYNC_CALL, timeout)
+    results[SYNC_LABEL] = {"cold_s": _timed_run(at), "sheet_calls": _sheet_calls() - before}
+
+    for label, function in BENCHMARKS:
+        if only and label not in only and function not in only:
+            continue
+        call = f"ceekay_app.{function}()"
+
+        _timed_run(_new_test(RESET_CALL, timeout))
+        before = _sheet_calls()
+        at = _new_test(call, timeout)
+        cold = _timed_run(at)
+        calls = _sheet_calls() - before
+        warm = [_timed_run(at) for _ in range(repeat)]
+
+        _timed_run(_new_test(RESET_CALL, timeout))
+        tracemalloc.start()
+        try:
+            _timed_run(_new_test(call, timeout))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        results[label] = {
+            "cold_s": cold,
+            "warm_s": statistics.median(warm) if warm else None,
+            "peak_mb": peak / 2**20,
+            "sheet_calls": calls,
+        }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':22s} {'cold':>9s} {'warm':>9s} {'peak MB':>9s} {'calls':>6s}")
+    for label, result in results.items():
+        cells = [f"{result['cold_s'] * 1000:7.0f}ms"]
+        cells.append(f"{result['warm_s'] * 1000:7.0f}ms" if result.get("warm_s") is not None else f"{'':9s}")
+        cells.append(f"{result['peak_mb']:9.1f}" if "peak_mb" in result else f"{'':9s}")
+        cells.append(f"{result['sheet_calls']:6d}")
+        line = f"{label:22s} " + " ".join(cells)
+        previous = (baseline or {}).get(label)
+        if previous and previous.get("warm_s") and result.get("warm_s"):
+            line += f"   warm {result['warm_s'] / previous['warm_s'] - 1:+.0%} vs baseline"
+        print(line)
+
+
+def regressions(results, baseline, tolerance):
+    """Benchmarks whose warm time or sheet calls got worse than ``baseline`` allows."""
+    found = []
+    for label, result in results.items():
+        previous = baseline.get(label)
+        if not previous:
+            continue
+        if result["sheet_calls"] > previous["sheet_calls"]:
+            found.append(f"{label}: {previous['sheet_calls']} -> {result['sheet_calls']} sheet calls")
+        if previous.get("warm_s") and result.get("warm_s") and result["warm_s"] > previous["warm_s"] * (1 + tolerance):
+            found.append(f"{label}: warm {previous['warm_s'] * 1000:.0f}ms -> {result['warm_s'] * 1000:.0f}ms")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the CEEKAY report pages against synthetic fleet data.")
+    parser.add_argument("--vehicles", type=int, default=20)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--shifts", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="warm reruns per page")
+    parser.add_argument("--only", nargs="*", help="benchmark labels or function names to run")
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="results file from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed warm slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="ceekay-bench-") as workdir:
+        rows = prepare(Path(workdir), args.vehicles, args.years, args.shifts, args.seed)
+        print(", ".join(f"{title} {count:,}" for title, count in rows.items()))
+        results = run_benchmarks(args.repeat, only=args.only)
+
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else None
+    print_results(results, baseline)
+    if args.json:
+        args.json.write_text(json.dumps({"rows": rows, "results": results}, indent=2))
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
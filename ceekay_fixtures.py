@@ -0,0 +1,214 @@
+"""Synthetic CEEKAY fleet data for local runs, load tests and benchmarks.
+
+``make_workbook`` builds every worksheet the app reads (drivers,
+daily_reports, vehicle_master, vehicle_variable_costs and monthly_cash_flow)
+for a fleet of any size: each vehicle runs ``shifts`` driver shifts a day
+for ``years`` years up to ``end``. The figures follow the app's own rules
+(30% driver salary on fare net of tolls, running cost from cost per KM), so
+every page has realistic totals to show. Output is deterministic for a seed.
+
+Write a workbook to CSV files and run the app against it with::
+
+    python ceekay_fixtures.py fleet_data --vehicles 20 --years 5 --shifts 3
+    CEEKAY_BACKEND=local CEEKAY_LOCAL_DATA=fleet_data streamlit run ceekay_app.py
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+from ceekay_storage import LocalBackend
+
+# Column order as the app writes each sheet. deduction and approved_by stand in
+# for the two daily_reports columns the app fills with 0 and "" but never reads.
+DRIVERS_HEADER = ["driver_name", "username", "password", "vehicle_no"]
+DAILY_REPORTS_HEADER = [
+    "timestamp", "date", "driver_name", "vehicle_no",
+    "start_mileage", "end_mileage", "daily_mileage", "uber_hire_mileage", "loss_mileage",
+    "fare", "tip", "toll_fee", "other_expenses", "cash_collected", "deduction",
+    "driver_salary", "total_driver_salary", "amount_to_ceekay",
+    "status", "admin_note", "approved_by", "platform_fee", "bank_deposit",
+    "cost_per_km", "vehicle_running_cost",
+]
+VEHICLE_MASTER_HEADER = [
+    "vehicle_no", "license_date", "insurance_date", "lease_installment", "lease_total",
+    "lease_start", "alignment_interval_km", "air_filter_interval_km", "purchase_date",
+    "purchase_cost", "useful_years", "cost_per_km",
+]
+VEHICLE_VARIABLE_COSTS_HEADER = ["date", "vehicle_no", "category", "description", "amount"]
+MONTHLY_CASH_FLOW_HEADER = ["month", "electricity_bill", "updated_at", "note"]
+
+FIRST_NAMES = [
+    "Amal", "Nimal", "Sunil", "Kasun", "Ruwan", "Chaminda", "Lahiru", "Dinesh",
+    "Saman", "Pradeep", "Tharindu", "Nuwan", "Asanka", "Mahesh", "Janaka", "Roshan",
+]
+SURNAMES = [
+    "Perera", "Fernando", "Silva", "Jayasinghe", "Bandara", "Wickramasinghe",
+    "Dissanayake", "Gunasekara", "Ranasinghe", "Herath",
+]
+VEHICLE_PREFIXES = ["CAB", "CAD", "CBH", "KX", "PH"]
+ALIGNMENT_INTERVAL_KM = 5000
+AIR_FILTER_INTERVAL_KM = 10000
+PENDING_DAYS = 3
+
+
+def _month_starts(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def _make_fleet(rnd, vehicles, shifts, start):
+    fleet = []
+    plates = set()
+    while len(plates) < vehicles:
+        plates.add((rnd.choice(VEHICLE_PREFIXES), rnd.randint(1000, 9999)))
+    for prefix, number in sorted(plates):
+        purchased = start - timedelta(days=rnd.randint(30, 900))
+        fleet.append({
+            # Both "CAB-1234" and "CAB 1234" occur in the real sheets.
+            "vehicle_no": f"{prefix}{rnd.choice('- ')}{number}",
+            "purchase_date": purchased,
+            "purchase_cost": rnd.randrange(4_500_000, 9_000_000, 50_000),
+            "useful_years": rnd.choice([5, 6, 8]),
+            "cost_per_km": rnd.choice([11.5, 12.5, 14.0, 16.5]),
+            "lease_installment": rnd.randrange(60_000, 150_000, 1_000),
+            "odometer": rnd.randint(5_000, 60_000),
+        })
+    names = [f"{first} {last}" for last in SURNAMES for first in FIRST_NAMES]
+    rnd.shuffle(names)
+    drivers = []
+    for i in range(vehicles * shifts):
+        # More drivers than name combinations only happens on very large fleets.
+        name = names[i % len(names)] + ("" if i < len(names) else f" {i // len(names) + 1}")
+        drivers.append({"driver_name": name, "vehicle": fleet[i % vehicles], "shift": i // vehicles})
+    return fleet, drivers
+
+
+def _daily_report(rnd, driver, day, pending):
+    vehicle = driver["vehicle"]
+    start_mileage = vehicle["odometer"]
+    daily_mileage = rnd.randint(60, 190)
+    vehicle["odometer"] += daily_mileage
+    loss_mileage = rnd.randint(5, min(40, daily_mileage))
+    fare = round(daily_mileage * rnd.uniform(45, 75), -1)
+    tip = rnd.choice([0, 0, 0, 100, 200, 500])
+    toll_fee = rnd.choice([0, 0, 0, 300, 600])
+    other_expenses = rnd.choice([0] * 9 + [rnd.randrange(200, 3000, 50)])
+    cash_collected = round(fare * rnd.uniform(0.3, 0.7), -1)
+    driver_salary = round(max(0, fare - toll_fee) * 0.30, 2)
+    total_driver_salary = round(driver_salary + toll_fee + tip, 2)
+    if pending:
+        status, platform_fee, bank_deposit = "Pending", 0, 0
+    else:
+        status = "Incorrect" if rnd.random() < 0.02 else "Correct"
+        platform_fee = round(fare * rnd.uniform(0.2, 0.27), 2)
+        bank_deposit = round(fare - cash_collected, 2)
+    # Shifts start at 6:00, 14:00 and 22:00 and are reported at the end.
+    submitted = datetime.combine(day, datetime.min.time()) + timedelta(hours=14 + 8 * driver["shift"], minutes=rnd.randint(0, 50))
+    return [
+        submitted.strftime("%Y-%m-%d %H:%M:%S"), day.isoformat(),
+        driver["driver_name"], vehicle["vehicle_no"],
+        start_mileage, start_mileage + daily_mileage, daily_mileage,
+        daily_mileage - loss_mileage, loss_mileage,
+        fare, tip, toll_fee, other_expenses, cash_collected, 0,
+        driver_salary, total_driver_salary, round(cash_collected - total_driver_salary, 2),
+        status, "", "", platform_fee, bank_deposit,
+        vehicle["cost_per_km"], round(daily_mileage * vehicle["cost_per_km"], 2),
+    ]
+
+
+def _service_costs(rnd, vehicle, day, last_service):
+    """Expense rows for alignment and air filter services falling due on ``day``."""
+    rows = []
+    odometer = vehicle["odometer"]
+    for kind, interval, label, price in (
+        ("alignment", ALIGNMENT_INTERVAL_KM, "Wheel alignment at {} km", (2500, 4500)),
+        ("air_filter", AIR_FILTER_INTERVAL_KM, "Air filter replaced at {} km", (1800, 3500)),
+    ):
+        if odometer - last_service.setdefault(kind, odometer) >= interval:
+            last_service[kind] = odometer
+            rows.append([day.isoformat(), vehicle["vehicle_no"], "Service", label.format(odometer), rnd.randrange(*price, 50)])
+    return rows
+
+
+def make_workbook(vehicles=20, years=5, shifts=3, end=None, seed=0):
+    """Return {sheet title: rows, header first} for a synthetic fleet."""
+    rnd = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=round(365.25 * years) - 1)
+    fleet, drivers = _make_fleet(rnd, vehicles, shifts, start)
+
+    daily = [DAILY_REPORTS_HEADER]
+    costs = [VEHICLE_VARIABLE_COSTS_HEADER]
+    services = {vehicle["vehicle_no"]: {} for vehicle in fleet}
+    day = start
+    while day <= end:
+        pending_day = (end - day).days < PENDING_DAYS
+        for driver in drivers:
+            if rnd.random() < 0.05:  # day off
+                continue
+            pending = pending_day and rnd.random() < 0.6
+            daily.append(_daily_report(rnd, driver, day, pending))
+        for vehicle in fleet:
+            costs.extend(_service_costs(rnd, vehicle, day, services[vehicle["vehicle_no"]]))
+            if rnd.random() < 0.01:
+                category = rnd.choice(["Repair", "Tyre", "Battery", "Other"])
+                costs.append([day.isoformat(), vehicle["vehicle_no"], category, f"{category} work", rnd.randrange(3000, 60000, 500)])
+        day += timedelta(days=1)
+
+    master = [VEHICLE_MASTER_HEADER]
+    for vehicle in fleet:
+        master.append([
+            vehicle["vehicle_no"],
+            (end + timedelta(days=rnd.randint(10, 360))).isoformat(),
+            (end + timedelta(days=rnd.randint(10, 360))).isoformat(),
+            vehicle["lease_installment"], 60, vehicle["purchase_date"].isoformat(),
+            ALIGNMENT_INTERVAL_KM, AIR_FILTER_INTERVAL_KM, vehicle["purchase_date"].isoformat(),
+            vehicle["purchase_cost"], vehicle["useful_years"], vehicle["cost_per_km"],
+        ])
+
+    cash_flow = [MONTHLY_CASH_FLOW_HEADER]
+    for month in _month_starts(start, end):
+        cash_flow.append([month.strftime("%Y-%m"), rnd.randrange(3000, 12000, 10), f"{month.isoformat()} 09:00:00", ""])
+        for vehicle in fleet:
+            costs.append([month.isoformat(), vehicle["vehicle_no"], "Leasing", "Monthly lease installment", vehicle["lease_installment"]])
+    costs[1:] = sorted(costs[1:], key=lambda row: row[0])
+
+    return {
+        "drivers": [DRIVERS_HEADER] + [
+            [d["driver_name"], d["driver_name"].split()[0].lower() + str(i + 1), "changeme", d["vehicle"]["vehicle_no"]]
+            for i, d in enumerate(drivers)
+        ],
+        "daily_reports": daily,
+        "vehicle_master": master,
+        "vehicle_variable_costs": costs,
+        "monthly_cash_flow": cash_flow,
+    }
+
+
+def populate(backend, workbook):
+    """Load a workbook from make_workbook() into a LocalBackend."""
+    for title, rows in workbook.items():
+        backend.add_worksheet(title, rows)
+    return backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic CEEKAY workbook as CSV files.")
+    parser.add_argument("directory", help="folder for the CSV files (CEEKAY_LOCAL_DATA)")
+    parser.add_argument("--vehicles", type=int, default=20)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--shifts", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last report date, YYYY-MM-DD (default today)")
+    args = parser.parse_args(argv)
+
+    workbook = make_workbook(args.vehicles, args.years, args.shifts, args.end, args.seed)
+    populate(LocalBackend(args.directory), workbook)
+    for title, rows in workbook.items():
+        print(f"{title:24s} {len(rows) - 1:>8,} rows")
+
+
+if __name__ == "__main__":
+    main()
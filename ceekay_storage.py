@@ -0,0 +1,433 @@
+"""Storage backends for the CEEKAY_Driver_Reports workbook.
+
+The app only uses a small part of the gspread Worksheet API: ``title``,
+``get_all_values``, ``get_all_records``, ``get``, ``batch_get``, ``append_row``,
+``append_rows``, ``update_cell``, ``update`` and ``batch_update``. Any object that
+provides those calls can stand in for a worksheet.
+
+``GspreadBackend`` hands out real gspread worksheets. ``LocalBackend`` keeps
+worksheets in memory, optionally backed by one CSV file per worksheet, so the
+app can be run, profiled and load-tested without Google credentials. Both
+provide ``batch_get_values`` to download several worksheets in one go.
+
+``LOCAL_CALLS`` counts the LocalBackend calls that would be Sheets API
+requests against a real workbook, so benchmarks can report them.
+
+A backend given a ``QuotaGovernor`` takes a token for every request it makes
+and raises ``QuotaExhausted`` instead of calling Sheets once the per-minute
+budget is spent.
+"""
+import csv
+import functools
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import gspread
+from gspread.utils import absolute_range_name, fill_gaps, numericise_all
+from oauth2client.service_account import ServiceAccountCredentials
+
+LOCAL_CALLS = Counter()
+
+GOOGLE_SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+# -------------------------------------------------------------------
+# QUOTA GOVERNOR
+# -------------------------------------------------------------------
+class QuotaExhausted(Exception):
+    """A Sheets request was held back (or refused with 429) because the quota is used up."""
+
+    def __init__(self, kind):
+        super().__init__(f"Google Sheets {kind} quota used up for this minute")
+        self.kind = kind
+
+
+class TokenBucket:
+    """``capacity`` tokens, refilled continuously at ``capacity`` per minute."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def take(self, keep=0):
+        """Take one token if more than ``keep`` would be left standing; return whether it did."""
+        self._refill()
+        if self.tokens - 1 < keep:
+            return False
+        self.tokens -= 1
+        return True
+
+    def drain(self):
+        self._refill()
+        self.tokens = 0.0
+
+
+class QuotaGovernor:
+    """Client-side budget for the Sheets per-minute read and write quotas.
+
+    Reads and writes have a bucket each, as Sheets counts them separately.
+    Writes come first: ordinary reads leave ``read_reserve`` read tokens for
+    reads made inside ``priority()``, which the write path uses to check
+    whether an earlier attempt landed. A 429 from Sheets empties the bucket,
+    so other callers back off too.
+    """
+
+    def __init__(self, reads_per_minute, writes_per_minute, read_reserve=0):
+        self._buckets = {"read": TokenBucket(reads_per_minute), "write": TokenBucket(writes_per_minute)}
+        self.read_reserve = read_reserve
+        self.denied = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def priority(self):
+        outer = getattr(self._local, "priority", False)
+        self._local.priority = True
+        try:
+            yield
+        finally:
+            self._local.priority = outer
+
+    def acquire(self, kind):
+        """Take a token for one ``kind`` ("read" or "write") request, or raise QuotaExhausted."""
+        keep = 0 if kind == "write" or getattr(self._local, "priority", False) else self.read_reserve
+        with self._lock:
+            if self._buckets[kind].take(keep):
+                return
+            self.denied[kind] += 1
+        raise QuotaExhausted(kind)
+
+    def call(self, kind, func, *args, **kwargs):
+        """Run one Sheets request within the quota; a 429 reply also becomes QuotaExhausted."""
+        self.acquire(kind)
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as exc:
+            if getattr(exc, "code", None) != 429:
+                raise
+            with self._lock:
+                self._buckets[kind].drain()
+            raise QuotaExhausted(kind) from exc
+
+    def status(self):
+        """{kind: (tokens left, requests held back)}."""
+        with self._lock:
+            for bucket in self._buckets.values():
+                bucket._refill()
+            return {kind: (int(bucket.tokens), self.denied[kind]) for kind, bucket in self._buckets.items()}
+
+
+class GovernedWorksheet:
+    """Worksheet wrapper that runs every API call past a QuotaGovernor."""
+
+    READS = {"get_all_values", "get_all_records", "get", "batch_get"}
+    WRITES = {"append_row", "append_rows", "update_cell", "update", "batch_update"}
+
+    def __init__(self, worksheet, governor):
+        self._worksheet = worksheet
+        self._governor = governor
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        kind = "read" if name in self.READS else "write" if name in self.WRITES else None
+        if kind is None:
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._governor.call(kind, attr, *args, **kwargs)
+
+        return call
+
+
+# -------------------------------------------------------------------
+# BACKENDS
+# -------------------------------------------------------------------
+class StorageBackend:
+    """Opens worksheets of one workbook by title, within ``governor``'s quota if set."""
+
+    governor = None
+
+    def worksheet(self, title):
+        raise NotImplementedError
+
+    def create_worksheet(self, title, header):
+        raise NotImplementedError
+
+    def _fetch_values(self, titles):
+        return {title: self.worksheet(title).get_all_values() for title in titles}
+
+    def _governed(self, kind, func, *args):
+        if self.governor is None:
+            return func(*args)
+        return self.governor.call(kind, func, *args)
+
+    def open_worksheet(self, title, header=None):
+        """Open a worksheet, creating it with ``header`` if it does not exist yet."""
+        try:
+            ws = self._governed("read", self.worksheet, title)
+        except gspread.WorksheetNotFound:
+            if header is None:
+                raise
+            ws = self._governed("write", self.create_worksheet, title, header)
+        return ws if self.governor is None else GovernedWorksheet(ws, self.governor)
+
+    def batch_get_values(self, titles):
+        """Return {title: get_all_values() rows} for several worksheets."""
+        return self._governed("read", self._fetch_values, list(titles))
+
+
+# -------------------------------------------------------------------
+# GOOGLE SHEETS
+# -------------------------------------------------------------------
+class GspreadBackend(StorageBackend):
+    def __init__(self, credentials_info, workbook_name, governor=None):
+        self.governor = governor
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(credentials_info, GOOGLE_SCOPE)
+        self.client = gspread.authorize(creds)
+        self.spreadsheet = self.client.open(workbook_name)
+
+    def worksheet(self, title):
+        return self.spreadsheet.worksheet(title)
+
+    def create_worksheet(self, title, header):
+        ws = self.spreadsheet.add_worksheet(title=title, rows=200, cols=len(header))
+        ws.append_row(header)
+        return ws
+
+    def _fetch_values(self, titles):
+        # One values.batchGet request for all worksheets instead of one request each.
+        response = self.spreadsheet.values_batch_get([absolute_range_name(t) for t in titles])
+        values = {}
+        for title, value_range in zip(titles, response.get("valueRanges", [])):
+            rows = value_range.get("values", [])
+            # Pad ragged rows the way Worksheet.get_all_values does.
+            values[title] = fill_gaps(rows) if rows else []
+        return values
+
+
+# -------------------------------------------------------------------
+# LOCAL (IN-MEMORY / CSV) WORKSHEETS
+# -------------------------------------------------------------------
+_CELL_RE = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+
+def _column_number(letters):
+    number = 0
+    for ch in letters.upper():
+        number = number * 26 + ord(ch) - 64
+    return number
+
+
+def _cell_text(value):
+    """Render a value the way Sheets shows it with the default number format."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def _trim(rows):
+    """Drop trailing empty cells and rows, as the Sheets values API does."""
+    trimmed = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+class LocalWorksheet:
+    """Worksheet held as a list of string rows, mimicking the gspread calls the app makes."""
+
+    def __init__(self, title, rows=None, path=None):
+        self.title = title
+        self.path = path
+        self._lock = threading.RLock()
+        self._rows = [[_cell_text(v) for v in row] for row in rows or []]
+        if path is not None and rows is None and Path(path).exists():
+            with open(path, newline="", encoding="utf-8") as fh:
+                self._rows = [list(row) for row in csv.reader(fh)]
+
+    # ---------------- helpers ----------------
+    def _count(self, call):
+        LOCAL_CALLS[call] += 1
+
+    def _width(self):
+        return max((len(row) for row in self._rows), default=0)
+
+    def _parse_range(self, range_name):
+        """Turn A1 notation (open-ended ranges allowed) into 1-based inclusive bounds."""
+        range_name = str(range_name).split("!")[-1]
+        start, _, end = range_name.partition(":")
+        first = _CELL_RE.match(start.strip())
+        last = _CELL_RE.match((end or start).strip())
+        if first is None or last is None:
+            raise ValueError(f"Unsupported range: {range_name}")
+        r1 = int(first.group(2)) if first.group(2) else 1
+        c1 = _column_number(first.group(1)) if first.group(1) else 1
+        r2 = int(last.group(2)) if last.group(2) else max(len(self._rows), r1)
+        c2 = _column_number(last.group(1)) if last.group(1) else max(self._width(), c1)
+        return r1, c1, r2, c2
+
+    def _write_block(self, row, col, values):
+        for i, values_row in enumerate(values):
+            target = row + i
+            while len(self._rows) < target:
+                self._rows.append([])
+            cells = self._rows[target - 1]
+            needed = col - 1 + len(values_row)
+            if len(cells) < needed:
+                cells.extend([""] * (needed - len(cells)))
+            for j, value in enumerate(values_row):
+                cells[col - 1 + j] = _cell_text(value)
+
+    def _save(self):
+        if self.path is None:
+            return
+        with open(self.path, "w", newline="", encoding="utf-8") as fh:
+            csv.writer(fh).writerows(self._rows)
+
+    # ---------------- reads ----------------
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def _values(self):
+        with self._lock:
+            rows = _trim(self._rows)
+            width = max((len(row) for row in rows), default=0)
+            return [row + [""] * (width - len(row)) for row in rows]
+
+    def _get(self, range_name):
+        r1, c1, r2, c2 = self._parse_range(range_name)
+        block = [row[c1 - 1:c2] for row in self._rows[r1 - 1:r2]]
+        return _trim(block)
+
+    def get_all_values(self, **kwargs):
+        self._count("get_all_values")
+        return self._values()
+
+    def get_all_records(self, **kwargs):
+        self._count("get_all_records")
+        values = self._values()
+        if not values:
+            return []
+        header = values[0]
+        return [dict(zip(header, numericise_all(row))) for row in values[1:]]
+
+    def get(self, range_name, **kwargs):
+        self._count("get")
+        with self._lock:
+            return self._get(range_name)
+
+    def batch_get(self, ranges, **kwargs):
+        self._count("batch_get")
+        with self._lock:
+            return [self._get(range_name) for range_name in ranges]
+
+    # ---------------- writes ----------------
+    def append_row(self, values, **kwargs):
+        self._count("append_row")
+        self._append([values])
+
+    def append_rows(self, values, **kwargs):
+        self._count("append_rows")
+        self._append(values)
+
+    def _append(self, values):
+        with self._lock:
+            rows = [[_cell_text(v) for v in row] for row in values]
+            self._rows = _trim(self._rows)
+            self._rows.extend(rows)
+            if self.path is not None:
+                with open(self.path, "a", newline="", encoding="utf-8") as fh:
+                    csv.writer(fh).writerows(rows)
+
+    def update_cell(self, row, col, value):
+        self._count("update_cell")
+        with self._lock:
+            self._write_block(row, col, [[value]])
+            self._save()
+
+    def update(self, range_name=None, values=None, **kwargs):
+        # gspread accepts both update(range, values) and update(values, range).
+        if isinstance(range_name, list):
+            range_name, values = values, range_name
+        self._count("update")
+        with self._lock:
+            r1, c1, _, _ = self._parse_range(range_name or "A1")
+            self._write_block(r1, c1, values)
+            self._save()
+
+    def batch_update(self, data, **kwargs):
+        self._count("batch_update")
+        with self._lock:
+            for item in data:
+                r1, c1, _, _ = self._parse_range(item["range"])
+                self._write_block(r1, c1, item["values"])
+            self._save()
+
+
+class LocalBackend(StorageBackend):
+    """Workbook of LocalWorksheets, kept in memory or as CSV files in ``directory``."""
+
+    def __init__(self, directory=None, governor=None):
+        self.governor = governor
+        self.directory = Path(directory) if directory else None
+        self._sheets = {}
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for path in sorted(self.directory.glob("*.csv")):
+                self._sheets[path.stem] = LocalWorksheet(path.stem, path=path)
+
+    def _path(self, title):
+        return self.directory / f"{title}.csv" if self.directory is not None else None
+
+    def worksheet(self, title):
+        LOCAL_CALLS["worksheet"] += 1
+        with self._lock:
+            if title not in self._sheets:
+                raise gspread.WorksheetNotFound(title)
+            return self._sheets[title]
+
+    def _fetch_values(self, titles):
+        # A single values.batchGet request on a real workbook.
+        LOCAL_CALLS["batch_get_values"] += 1
+        with self._lock:
+            missing = [title for title in titles if title not in self._sheets]
+            if missing:
+                raise gspread.WorksheetNotFound(missing[0])
+            sheets = [self._sheets[title] for title in titles]
+        return {ws.title: ws._values() for ws in sheets}
+
+    def add_worksheet(self, title, rows):
+        """Create (or replace) a worksheet holding ``rows``; the first row is the header."""
+        with self._lock:
+            ws = LocalWorksheet(title, rows=rows, path=self._path(title))
+            ws._save()
+            self._sheets[title] = ws
+            return ws
+
+    def create_worksheet(self, title, header):
+        return self.add_worksheet(title, [header])